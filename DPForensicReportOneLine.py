@@ -4,27 +4,38 @@
 #Last Updated: 21 June 2024
 #version 1.2
 import os
+import collections
+import contextlib
+import copy
 import csv
+import gzip
+import hashlib
+import heapq
+import itertools
 import io
+import ipaddress
+import json
 import re
+import sqlite3
+import sys
 import time
-try:
-    from benchmark import LoopTimer
-except ImportError:
-    class LoopTimer:
-        def __init__(self, *args, **kwargs): pass
-        def reset(self): pass
-        def lap(self, *args, **kwargs): return 0
-        def total(self, *args, **kwargs): return 0
-BENCHMARK_ENABLED = False
-
+import pickle
+import shutil
+import signal
+import socket
+import tarfile
+import tempfile
+import zipfile
 from datetime import datetime
 
-try:
-    import openpyxl
-except ImportError:
-    print("openpyxl is not installed. Please install it by running: pip install openpyxl")
-    exit()
+def load_openpyxl():
+    #openpyxl is only needed for xlsx output and takes longer to import than the rest of the script together,
+    #so it is imported the first time a workbook is written.
+    global openpyxl
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("openpyxl is not installed. Please install it by running: pip install openpyxl")
 
 input_path = "./input/"
 output_path = "./output/"
@@ -33,57 +44,377 @@ maxWidth=64
 ColorAlternateRows = True
 fillColor = 'F0F0F0F0'
 hideEmptyColumns = True
+workers = 1 #Number of processes used to parse entries. Can be overridden with --workers
+batchSize = 200 #Entries sent to a worker process at a time
+jobs = 1 #Number of input files processed at the same time. Can be overridden with --jobs
+dateLookahead = 5000 #For inputs that can't be rewound, such as some archive members: entries read while looking for an unambiguous date before falling back to month first. Files are scanned to the end
+dateLookaheadBytes = 16 * 1024 * 1024 #Most entry text held in memory while looking, for inputs that can't be rewound
+outputFormats = ["xlsx"] #Any of xlsx, csv, jsonl, sqlite, parquet. Can be overridden with --format
+incremental = True #Keep a manifest of processed inputs so unchanged reports are skipped and grown ones only parse their new entries. Can be turned off with --no-incremental
+manifestName = "manifest.sqlite" #Manifest file in the output folder
+checkpointEntries = 5000 #Entries between saved checkpoints, so an interrupted run can resume
+verbose = False #Print a message for every corrupt entry. Otherwise only the counts per Err code are shown. Can be turned on with --verbose
+progressInterval = 1.0 #Seconds between updates of the progress line. Can be turned off with --no-progress
+showProgress = True
+buildIndex = False #Add every report processed to the attack index in the output folder. Can be turned on with --index
+indexName = "attacks.sqlite" #Attack index file in the output folder. Searched with the query command
+skipFolders = ["noprocess", "ignore", "old"] #Folders in the input folder that are never processed, along with everything in them
+watchInterval = 2.0 #Seconds between scans of the input folder with --watch. Can be overridden with --watch-interval
+settleSeconds = 5.0 #With --watch, a report is only picked up once its size and modification time have stayed the same this long, so reports still being copied in are left alone. Can be overridden with --settle
+statusInterval = 60.0 #Seconds between queue and throughput lines with --watch while reports are queued or running. A line is also printed when a report finishes
+xlsxMaxRows = 1048576 #Rows per xlsx sheet, header included. Larger reports carry on in another sheet or workbook. Excel can't open sheets with more than 1048576. Can be overridden with --xlsx-max-rows
+xlsxShardMode = "sheet" #Where a full sheet carries on: "sheet" adds a sheet to the workbook, "workbook" starts <name>_part2.xlsx and so on. Can be set with --xlsx-shard
+metricsFormat = None #Write a per file metrics summary next to the outputs: "json" or "prom" (Prometheus textfile). Can be set with --metrics
+maxSampleValues = 0 #Keep only the N most frequent values in each sample column. 0 keeps them all. Can be overridden with --max-sample-values
+class clsOptions:
+    #Settings for converting one report. Each defaults to the matching setting above, and any of them can be given
+    #by name, e.g. clsOptions(formats=["csv"], sampleLimit=50). Passed to convert, processData and the writers,
+    #so callers don't need to change the globals.
+    def __init__(self, **settings):
+        self.formats = list(outputFormats)
+        self.workers = workers
+        self.sampleLimit = maxSampleValues
+        self.interactive = False #Progress line and the retry prompt when an output is locked. Only on by default for a run over a folder
+        self.showProgress = showProgress
+        self.metricsFormat = metricsFormat
+        self.checkpointEntries = checkpointEntries
+        self.colorAlternateRows = ColorAlternateRows
+        self.hideEmptyColumns = hideEmptyColumns
+        self.xlsxMaxRows = xlsxMaxRows
+        self.xlsxShardMode = xlsxShardMode
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown option '{name}'")
+            setattr(self, name, value)
+
+class clsBatchOptions(clsOptions):
+    #Settings for a run over the input folder: the conversion settings plus where reports come from and go to.
+    def __init__(self, **settings):
+        self.inputPath = input_path
+        self.outputPath = output_path
+        self.jobs = None #None runs one job per CPU when archives are found, otherwise jobs
+        self.incremental = incremental
+        self.replaceExisting = replaceExistingFile
+        self.buildIndex = buildIndex
+        self.watchInterval = watchInterval
+        self.settleSeconds = settleSeconds
+        settings.setdefault("interactive", True)
+        super().__init__(**settings)
+
 DataHeaders = ["S.No","Start Time","End Time","Device IP Address","Threat Category","Attack Name","Policy Name","Action","Attack ID","Source IP Address","Source Port","Destination IP Address","Destination Port","Direction","Protocol","Radware ID","Duration","Total Packets","Total Packets Dropped","Packet Type","Total Mbits","Total Mbits Dropped","Max pps","Max bps","Max Attack Rate in Kb","Physical Port","Risk","VLAN Tag","Footprint","Device Name","Device Type","Workflow Rule Process","Activation Id","Protected Object"]
 
-def rowSearch(rowStr,entry):
-    try:
-        return re.search(rf'(\n{re.escape(rowStr)})(.+)',entry,re.MULTILINE).group(2)
-    except:
-        #rowStr not found.
-        return('')
+#Output headers. Include all our DataHeaders and add our custom combined columns
+sheetHeaders = DataHeaders + [
+    "Detail Footprint",
+    "Detail State",
+    "Detail Source IP",
+    "Detail Source Port",
+    "Detail Destination IP",
+    "Detail Destination Port",
+    "Sample Source IPs",
+    "Sample Source Ports",
+    "Sample Dest IPs",
+    "Sample Dest Ports",
+    "Sample Physical Ports",
+    "Sample Vlan Tags",
+    "Sample MPLS RD",
+    "Sample Protocol"]
+dateColumns = [sheetHeaders.index("Start Time"), sheetHeaders.index("End Time")]
+detailListColumns = [sheetHeaders.index("Detail Source IP"),
+                     sheetHeaders.index("Detail Source Port"),
+                     sheetHeaders.index("Detail Destination IP"),
+                     sheetHeaders.index("Detail Destination Port")
+                     ]
+sampleColumns = [sheetHeaders.index("Sample Source IPs"),
+                 sheetHeaders.index("Sample Source Ports"),
+                 sheetHeaders.index("Sample Dest IPs"),
+                 sheetHeaders.index("Sample Dest Ports"),
+                 sheetHeaders.index("Sample Physical Ports"),
+                 sheetHeaders.index("Sample Vlan Tags"),
+                 sheetHeaders.index("Sample MPLS RD"),
+                 sheetHeaders.index("Sample Protocol")
+                 ]
+
+#Type of the values held in each output column. Values are converted once when the entry is parsed and only
+#turned into cell values by the writer. Anything that does not convert is kept as text.
+#  int/float - numbers. ip - IPv4/IPv6 address. datetime - Start/End Time. text - left as is.
+ColumnTypes = {
+    "S.No": "int",
+    "Start Time": "datetime",
+    "End Time": "datetime",
+    "Device IP Address": "ip",
+    "Source IP Address": "ip",
+    "Source Port": "int",
+    "Destination IP Address": "ip",
+    "Destination Port": "int",
+    "Radware ID": "int",
+    "Duration": "int",
+    "Total Packets": "int",
+    "Total Packets Dropped": "int",
+    "Total Mbits": "float",
+    "Total Mbits Dropped": "float",
+    "Max pps": "int",
+    "Max bps": "int",
+    "Max Attack Rate in Kb": "float",
+    "Physical Port": "int",
+    "VLAN Tag": "int",
+    "Activation Id": "int",
+    "Detail Source IP": "ip",
+    "Detail Source Port": "int",
+    "Detail Destination IP": "ip",
+    "Detail Destination Port": "int",
+    "Sample Source IPs": "ip",
+    "Sample Source Ports": "int",
+    "Sample Dest IPs": "ip",
+    "Sample Dest Ports": "int",
+    "Sample Physical Ports": "int",
+    "Sample Vlan Tags": "int"}
+SheetColumnTypes = [ColumnTypes.get(header, "text") for header in sheetHeaders]
+
+def parse_value(text, kind):
+    #Convert one value from the report to the type of its column.
+    if kind == "int" or kind == "float":
+        if text.isdecimal():
+            return int(text) if kind == "int" else float(text)
+        if text.replace(".", "", 1).isdecimal():
+            return float(text)
+    elif kind == "ip":
+        try:
+            ip = ipaddress.ip_address(text)
+        except ValueError:
+            return text
+        #Keep the text unless it is already in the standard form, so the output shows what the device reported.
+        if str(ip) == text:
+            return ip
+    #Text values repeat heavily across entries (names, actions, protocols), so share one copy of each.
+    return sys.intern(text)
+
+def to_cell(value):
+    #Turn a parsed value into what is written to the cell.
+    #A tuple holds several values for one column (e.g. from a corrupt entry) and becomes a multi-line string.
+    if type(value) is tuple:
+        if all(type(v) is datetime for v in value):
+            return "\n".join(v.strftime("%Y-%m-%d %H:%M:%S") for v in value)
+        return '\n    '.join([str(v) for v in value]).strip()
+    if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return str(value)
+    if value == '':
+        return None
+    return value
+
+class clsMetrics:
+    #Running totals for the file being processed: seconds spent in each stage and counts of entries, bytes, samples
+    #and corrupt entries by Err code. Updating them is a dict add, so they are always on. Worker processes send theirs
+    #back with each batch to be merged. See take() and merge().
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self.errors = collections.defaultdict(int)
+
+    def lap(self, stage, start):
+        #Add the time since start to stage and return the time now, to start the next stage from.
+        now = time.perf_counter()
+        self.seconds[stage] += now - start
+        return now
+
+    def take(self):
+        snapshot = (dict(self.seconds), dict(self.counts), dict(self.errors))
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        for totals, values in zip((self.seconds, self.counts, self.errors), snapshot):
+            for key, value in values.items():
+                totals[key] += value
+
+    def summary(self, source, elapsed):
+        return {"source": source, "elapsed_seconds": round(elapsed, 4), "entries_per_second": round(self.counts["entries"] / elapsed, 1) if elapsed else None,
+                "counts": dict(self.counts), "errors": dict(self.errors), "stage_seconds": {stage: round(seconds, 4) for stage, seconds in self.seconds.items()}}
+
+    def write(self, path, metricsFormat, source, elapsed):
+        #Write the summary as JSON, or in the Prometheus text format for node_exporter's textfile collector.
+        #Each file holds the figures for one run, so they are gauges.
+        summary = self.summary(source, elapsed)
+        if metricsFormat == "json":
+            text = json.dumps(summary, indent=2) + "\n"
+        else:
+            label = 'source="' + source.replace('\\', '\\\\').replace('"', '\\"') + '"'
+            lines = ["# HELP dpforensic_elapsed_seconds Time taken to process the report.", "# TYPE dpforensic_elapsed_seconds gauge",
+                     f"dpforensic_elapsed_seconds{{{label}}} {elapsed}"]
+            lines += ["# HELP dpforensic_count Entries, bytes and samples processed.", "# TYPE dpforensic_count gauge"]
+            lines += [f'dpforensic_count{{{label},kind="{kind}"}} {value}' for kind, value in sorted(self.counts.items())]
+            lines += ["# HELP dpforensic_errors Corrupt entries by error code.", "# TYPE dpforensic_errors gauge"]
+            lines += [f'dpforensic_errors{{{label},code="{code}"}} {value}' for code, value in sorted(self.errors.items())]
+            lines += ["# HELP dpforensic_stage_seconds Time spent in each stage.", "# TYPE dpforensic_stage_seconds gauge"]
+            lines += [f'dpforensic_stage_seconds{{{label},stage="{stage}"}} {seconds}' for stage, seconds in sorted(self.seconds.items())]
+            text = "\n".join(lines) + "\n"
+        #Write next to the destination and move into place so a collector never reads half a file.
+        with open(path + ".tmp", 'w') as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+metrics = clsMetrics()
+
+def set_verbose(value):
+    #Worker process initializer, so per-entry logging follows the main process's --verbose.
+    global verbose
+    verbose = value
+
+#Entries are separated by a line of 69 asterisks, optionally followed by commas.
+separatorRegex = re.compile(r'\*{69},*\n')
+
+def iter_raw_entries(stream, startLine=1, positions=None):
+    #Walk the report line by line and yield one raw entry at a time along with the line number it starts on.
+    #Only the entry currently being assembled is held in memory, so peak usage depends on the largest entry, not the file size.
+    #Matches the behaviour of re.split(r'\n\*{69}(?:,*)\n', rawData): a separator must follow a newline and end with one,
+    #so the first line of an entry (or of the file) is never treated as a separator.
+    #If positions is given, the file position each entry starts at is appended to it, in order, for checkpoints.
+    lines = []
+    if positions is None:
+        source = stream
+    else:
+        #tell() can't be used while iterating over a file, so read with readline instead.
+        source = iter(stream.readline, '')
+        positions.append(stream.tell())
+    for line in source:
+        if lines and separatorRegex.fullmatch(line):
+            #The newline in front of the separator belongs to the separator, not the entry.
+            lines[-1] = lines[-1][:-1]
+            yield ''.join(lines), startLine
+            startLine += len(lines) + 1
+            lines = []
+            if positions is not None:
+                positions.append(stream.tell())
+        else:
+            lines.append(line)
+    yield ''.join(lines), startLine
+
+#Position of each header in DataHeaders. Used instead of DataHeaders.index() for every cell.
+DataHeaderIndex = {header: i for i, header in enumerate(DataHeaders)}
+DataHeaderTypes = SheetColumnTypes[:len(DataHeaders)]
+
+#Detail rows that follow the data row. Maps the row label to the clsEntry attribute it fills.
+DetailRows = {
+    "Footprint,": "footprint",
+    "State,": "state",
+    "Source IP,": "sIP",
+    "Source Port,": "sPort",
+    "Destination IP,": "dIP",
+    "Destination Port,": "dPort"}
+
+#Header rows are identical across most entries, so each distinct header line is only parsed once.
+#Cleared when it grows past headerCacheSize, as a corrupt entry with data run into its header line adds a new one.
+headerCache = {}
+headerCacheSize = 10000
+
+def splitRow(line):
+    #Parse a single csv line. Plain split is enough unless the line contains quotes.
+    if '"' in line:
+        return next(csv.reader((line,)), [])
+    if not line:
+        return []
+    return line.split(',')
+
+def isSampleStart(line):
+    #'SAMPLE DETAILS:' optionally followed by commas.
+    return line.startswith('SAMPLE DETAILS:') and line[15:].strip(',') == ''
+
+def add_value(current, value):
+    #Several data rows can fill the same column in a corrupt entry. Extra values are collected in a tuple.
+    if current is None:
+        return value
+    if type(current) is tuple:
+        return current + (value,)
+    return (current, value)
 
 class clsEntry:
+    #One parsed entry. data holds a typed value, a tuple of values or None for each of DataHeaders.
+    __slots__ = ("data", "error", "footprint", "state", "sIP", "sPort", "dIP", "dPort", "samples")
+
     def __init__(self,rawEntry,startLine=1):
         #Grab header columns from the second row of the entry.
-        self.data = []
-        for i in range(len(DataHeaders)):
-            self.data.append('')
+        self.data = [None] * len(DataHeaders)
+        self.error = None
+        self.samples = ()
         lines = rawEntry.splitlines()
+
+        #Sort every line into header, data, detail or sample row in a single sweep.
+        #A line can be more than one of these in a corrupt entry, e.g. a second header inside the samples section,
+        #so each check is made independently of the others.
         headerCount = 0
-        for line in lines:
+        pairs = []              #(header line, data line) in the order they appear
+        details = {}            #First line for each DetailRows label
+        sampleLines = []
+        pendingHeader = None
+        sampleState = 0         #0: before SAMPLE DETAILS:, 1: sample header line, 2: sample rows
+        lastIndex = len(lines) - 1
+        for lineIndex, line in enumerate(lines):
             if line.startswith("S.No,"):
                 headerCount += 1
+            if pendingHeader is not None:
+                #The line after a header is its data row, even if it looks like something else.
+                pairs.append((pendingHeader, line))
+                pendingHeader = None
+            elif line[:1] == 'S' and line[2:5] == 'No,' and lineIndex < lastIndex:
+                pendingHeader = line
+            if lineIndex > 0:
+                comma = line.find(',')
+                if comma >= 0:
+                    label = line[:comma + 1]
+                    if label in DetailRows and label not in details and len(line) > comma + 1:
+                        details[label] = line[comma + 1:]
+            if sampleState == 2:
+                sampleLines.append(line)
+            elif sampleState == 1:
+                sampleState = 2
+            elif lineIndex < lastIndex and isSampleStart(line):
+                sampleState = 1
+
         if headerCount > 1:
-            print(f"    Warning: Err1:Corrupt entry at line {startLine}. Multiple headers in same entry.")
+            metrics.errors["Err1"] += 1
+            if verbose:
+                print(f"    Warning: Err1:Corrupt entry at line {startLine}. Multiple headers in same entry.")
             self.data[0] = f"Err1:{startLine}"
             #self.defaultHeader[0] = "Multiple in same entry:"
         elif headerCount == 0:
-            print(f"    Warning: Err2:Corrupt entry at line {startLine}. Header line is missing.")
+            metrics.errors["Err2"] += 1
+            if verbose:
+                print(f"    Warning: Err2:Corrupt entry at line {startLine}. Header line is missing.")
             self.data[0] = f"Err2:{startLine}"
             #self.defaultHeader[0] = "Header line missing"
         if len(lines) < 2:
-            print(f"    Err3:Corrupt entry detected at line {startLine}. <2 lines in entry.")
+            metrics.errors["Err3"] += 1
+            if verbose:
+                print(f"    Err3:Corrupt entry detected at line {startLine}. <2 lines in entry.")
             self.error = f"Err3:{startLine}"
             return
         
-        matches = re.findall(r'(^S.No,.*\n)(.*$)',rawEntry, re.MULTILINE)
-        for match in matches:
-            reader = csv.reader(io.StringIO(match[0]))
-            #headers = next(reader)
-            headers = [h for h in next(reader) if h.strip() != '']
-            reader = csv.reader(io.StringIO(match[1]))
-            data = next(reader)
+        for headerLine, dataLine in pairs:
+            headers = headerCache.get(headerLine)
+            if headers is None:
+                if len(headerCache) > headerCacheSize:
+                    headerCache.clear()
+                headers = [h for h in splitRow(headerLine) if h.strip() != '']
+                headerCache[headerLine] = headers
+            data = splitRow(dataLine)
             if len(headers) > len(data): #We can't have more headers than entries
-                if data[0] in ['SAMPLE DETAILS:', 'State']:
+                metrics.errors["Err4"] += 1
+                if not verbose:
+                    pass
+                elif data and data[0] in ['SAMPLE DETAILS:', 'State']:
                     print(f"    Warning: Corrupt entry at line {startLine}. Missing or out of place data row.")
-                elif data[0] in ['S.No']:
+                elif data and data[0] in ['S.No']:
                     pass#second header. We've already notified the user of the issue. 
                 else:
                     print(f"    Warning: Corrupt entry at line {startLine}. More headers than data:")
                     print(f'      Data: {data}\n      Headers: {headers}')
-                self.data[0] = '\n    '.join([f"Err4:{startLine}",self.data[0]]).strip() 
-            if len(headers) > 11:
-                self.very_old_date_format = False
+                if self.data[0] is None:
+                    self.data[0] = f"Err4:{startLine}"
+                else:
+                    self.data[0] = (f"Err4:{startLine}",) + (self.data[0] if type(self.data[0]) is tuple else (self.data[0],))
             try:
                 if not data[0].isnumeric():
                     if not data[0].startswith('Err'):
@@ -93,349 +424,1673 @@ class clsEntry:
                 else:
                     for i, header in enumerate(headers):
                         if data[i] != '':
-                            index = DataHeaders.index(header)
-                            self.data[index] = '\n    '.join([self.data[index],data[i]]).strip()
+                            index = DataHeaderIndex.get(header)
+                            if index is None:
+                                raise ValueError(f"Unknown header '{header}'")
+                            value = data[i].strip()
+                            if value:
+                                value = parse_value(value, DataHeaderTypes[index])
+                            self.data[index] = add_value(self.data[index], value)
             except Exception as err:
-                print(f"  Bad Data detected when parsing entry at line {startLine}: Headers: {headers} Data: {data}")
-                print(f"      Details: ", err)
+                metrics.errors["Bad Data"] += 1
+                if verbose:
+                    print(f"  Bad Data detected when parsing entry at line {startLine}: Headers: {headers} Data: {data}")
+                    print(f"      Details: ", err)
         #Parse specific rows
-        self.footprint = rowSearch("Footprint,",rawEntry).strip('"')
-        self.state = rowSearch("State,",rawEntry)        
-        self.sIP = rowSearch("Source IP,",rawEntry)
+        for label, attribute in DetailRows.items():
+            setattr(self, attribute, details.get(label, ''))
+        self.footprint = self.footprint.strip('"')
         #If we matched the header row of the SAMPLE DETAILS section, the entry does not contain source ips.
         if self.sIP.startswith(" Source Port,"):
             self.sIP = ''
-        self.sPort = rowSearch("Source Port,",rawEntry)
-        self.dIP = rowSearch("Destination IP,",rawEntry)
-        self.dPort = rowSearch("Destination Port,",rawEntry)
-
-        #Parse Sample Data. DOTALL is so '.' matches newline
-        sampleMatch = re.search(r'(^SAMPLE DETAILS:(?:,*)\n)(.*)',rawEntry,re.MULTILINE | re.DOTALL)
-        self.samples=[]
-        if sampleMatch:
-            sampleLines = sampleMatch.group(2).splitlines()
-
-            #Iterate through sampleLines starting with line 2. Line 1 is a header.
-            for sampleLine in sampleLines[1:]:
-                reader = csv.reader(io.StringIO(sampleLine))
-                self.samples.append(next(reader))
+
+        #Parse Sample Data. The first line after SAMPLE DETAILS: is a header and was skipped above.
+        self.samples = [tuple(map(sys.intern, splitRow(sampleLine))) for sampleLine in sampleLines]
         #else:
         #    print(f"SAMPLE DETAILS not found for id: {self.defaultHeader[8]}")
 
 
+style_name_base = "RowStyle_Normal"
+style_name_alt = "RowStyle_Alt"
 
+class clsXlsxWriter:
+    #Streams rows into a write-only workbook so no cell objects are kept in memory.
+    #Width and hidden state of each column are tracked as rows are appended. A write-only sheet needs its column
+    #widths before the first row is written, so the finished rows are spooled to a temporary file and replayed on close.
+    #When resumable, the spool is kept next to the workbook as <name>.xlsx.rows so more rows can be added later.
+    #Every options.xlsxMaxRows rows the output rolls over to a new shard, a sheet or a workbook depending on
+    #options.xlsxShardMode, with its own header, frozen pane and column widths. Each shard is finished before the next
+    #one is written.
+    #In workbook mode the number of workbooks saved is kept in the checkpoint, so a later run that needs fewer of them
+    #only removes the part workbooks this output made. leftover is the checkpoint of an earlier run of the same input
+    #that is being started over.
+    extension = ".xlsx"
+    resumable = True
+    leftover = None
 
-def processData(rawData):
-    timer = LoopTimer(BENCHMARK_ENABLED)
-    timer.reset()
-    
-    #Identify date format:
-    def detect_date_format(raw_data):
-        # Regex for dates like 13.09.2024 00:09:35 or 09.13.2024 12:00:00
-        date_regex = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{2}):(\d{2}):(\d{2})')
-
-        for match in date_regex.finditer(raw_data):
-            d1, d2, year, h, m, s = match.groups()
-            d1 = int(d1)
-            d2 = int(d2)
-
-            # Check for unambiguous day/month
-            if d1 > 12 and d2 <= 12:
-                return "%d.%m.%Y %H:%M:%S"
-            elif d2 > 12 and d1 <= 12:
-                return "%m.%d.%Y %H:%M:%S"
-            elif d1 > 12 and d2 > 12:
-                # Technically invalid date, skip
-                continue
+    def __init__(self, headers, path, resumable=False, state=None, options=None):
+        load_openpyxl()
+        options = options or clsOptions()
+        self.headers = headers
+        self.path = path
+        self.dateColumns = [i for i, header in enumerate(headers) if header in ("Start Time", "End Time")]
+        self.maxRows = options.xlsxMaxRows
+        self.shardMode = options.xlsxShardMode
+        self.hideEmptyColumns = options.hideEmptyColumns
+        self.pendingBlankRows = 0
+        self.spoolPath = path + ".rows" if resumable else None
+        self.workbooks = state.get("workbooks", 0) if state else 0
+        self.lastCheckpoint = None
+        if state:
+            resume_file(self.spoolPath, self.spoolPath + ".tmp", state["size"])
+            self.spool = open(self.spoolPath + ".tmp", 'r+b')
+            self.spool.seek(0, os.SEEK_END)
+            self.shards = state["shards"]
+            self.shard = self.shards[-1]
+            self.pendingBlankRows = state["pendingBlankRows"]
+        else:
+            self.spool = open(self.spoolPath + ".tmp", 'w+b') if resumable else tempfile.TemporaryFile()
+            self.shards = []
+            self.new_shard()
 
-        # Default fallback (common case)
-        return "%m.%d.%Y %H:%M:%S"
-    dp_one_line_date_format = detect_date_format(rawData)
-    timer.lap("Date format detected")
-
-    #Initialize the workbook and sheet.
-    wb = openpyxl.Workbook()
-    sheet = wb.active
-
-    #Create the header row. Include all our DataHeaders and add our custom combined columns 
-    sheetHeaders = DataHeaders + [
-        "Detail Footprint",
-        "Detail State",
-        "Detail Source IP",
-        "Detail Source Port",
-        "Detail Destination IP",
-        "Detail Destination Port",
-        "Sample Source IPs",
-        "Sample Source Ports",
-        "Sample Dest IPs",
-        "Sample Dest Ports",
-        "Sample Physical Ports",
-        "Sample Vlan Tags",
-        "Sample MPLS RD",
-        "Sample Protocol"]
-    #print(sheetHeaders)
-    sheet.append(sheetHeaders)
-    timer.lap("Headers Appended")
-
-    #Make the headers bold
-    for cell in sheet["1:1"]:
-        cell.font = openpyxl.styles.Font(bold=True)
-    timer.lap("Headers Bold")
-
-     # Alignment and border shared by both styles
-    top_align = openpyxl.styles.Alignment(vertical='top', wrapText=True)
-    border_style = openpyxl.styles.borders.Border(
-        left=openpyxl.styles.borders.Side(style='hair'),
-        right=openpyxl.styles.borders.Side(style='hair'),
-        top=openpyxl.styles.borders.Side(style='thin'),
-        bottom=openpyxl.styles.borders.Side(style='thin')
-    )
-    # Fill for alternating rows
-    alt_fill = openpyxl.styles.PatternFill(start_color=fillColor, end_color=fillColor, fill_type='solid')
-    # Named styles
-    style_name_base = "RowStyle_Normal"
-    style_name_alt = "RowStyle_Alt"
-    style_normal = openpyxl.styles.NamedStyle(name=style_name_base)
-    style_normal.alignment = top_align
-    style_normal.border = border_style
-    style_alt = openpyxl.styles.NamedStyle(name=style_name_alt)
-    style_alt.alignment = top_align
-    style_alt.border = border_style
-    style_alt.fill = alt_fill
-    # Register styles once per workbook
-    for style in [style_normal, style_alt]:
-        if style.name not in wb.named_styles:
-            wb.add_named_style(style)
-    timer.lap("Styles defined")
-
-    #Create an array of all entries in the input file.
-    ##rawEntries = rawData.split("*********************************************************************\n")
-    rawEntries = re.split(r'\n\*{69}(?:,*)\n',rawData)
-    line_count = rawData.count('\n') + 1 if rawData else 0
-    print(f"    {len(rawEntries)} entries found over {line_count} lines.")
-    timer.total('ms')
-
-    #Loop through each item of the array, processing the data within and creating a row in our output sheet.
-    curRow = 2
-    curLine=1
-    format_set = False
-    startTime = time.perf_counter()
-    previous_entry = None
-    for rawEntry in rawEntries:
-        timer.reset()
-        if len(rawEntry) > 0:
-            #Populate entry with the desired data. See class clsEntry.
-            entry = clsEntry(rawEntry, curLine)
-            previous_entry = rawEntry
-            timer.lap("Entry class created")
-
-            if hasattr(entry,'error'):
-                sheet.cell(row=curRow,column=1).value = entry.error
-                curRow += 1
+    def new_shard(self):
+        #Row count, longest line and number of cells with data in each column of a shard. The header is its first row.
+        self.shard = {"rows": 0, "maxLength": [0] * len(self.headers), "cellsWithData": [0] * len(self.headers)}
+        self.shards.append(self.shard)
+        self.track(self.headers)
+
+    def track(self, values):
+        #Count the row and record the longest line and whether there is data in each column.
+        maxLength = self.shard["maxLength"]
+        cellsWithData = self.shard["cellsWithData"]
+        self.shard["rows"] += 1
+        for i, value in enumerate(values):
+            if value is not None:
+                text = value.strip() if type(value) is str else str(value)
+                if value != 'N/A':
+                    cellsWithData[i] += 1
+                for line in text.splitlines():
+                    if len(line) > maxLength[i]:
+                        maxLength[i] = len(line)
+
+    def append(self, values, style=None):
+        #Blank rows are only written if a later row follows them.
+        if not values:
+            self.pendingBlankRows += 1
+            return
+        for _ in range(self.pendingBlankRows):
+            if self.shard["rows"] >= self.maxRows:
+                self.new_shard()
+            self.shard["rows"] += 1
+            pickle.dump((None, []), self.spool, pickle.HIGHEST_PROTOCOL)
+        self.pendingBlankRows = 0
+        if self.shard["rows"] >= self.maxRows:
+            self.new_shard()
+        values = [to_cell(value) for value in values]
+        self.track(values)
+        pickle.dump((style, values), self.spool, pickle.HIGHEST_PROTOCOL)
+
+    def rows(self, ws, count):
+        #Replay the next count spooled rows as write-only cells.
+        #Setting a named style looks it up in the workbook every time, so each style, with and without the date format,
+        #is resolved once on a template cell. Its style array is shared by the cells, which are never changed once made.
+        resolved = {}
+        for _ in range(count):
+            style, values = pickle.load(self.spool)
+            if style is None:
+                yield values
                 continue
-            
-            #For troubleshooting, enable the following rows:
-            #print(f'Processing Attack ID: {entry.defaultHeader[8]} S.No: {entry.defaultHeader}')
-            #print(f'=============\n{rawEntry}\n==================')
-
-            #Populate the cells in our spreadsheet row.
-            for curColumn in range(len(DataHeaders)): #Populate columns A-Z
-                if entry.data[curColumn]:
-                    sheet.cell(row=curRow,column=curColumn + 1).value = entry.data[curColumn]
-            sheet.cell(row=curRow,column=len(DataHeaders)+1).value = entry.footprint
-            sheet.cell(row=curRow,column=len(DataHeaders)+2).value = entry.state
-            sheet.cell(row=curRow,column=len(DataHeaders)+3).value = entry.sIP
-            sheet.cell(row=curRow,column=len(DataHeaders)+4).value = entry.sPort
-            sheet.cell(row=curRow,column=len(DataHeaders)+5).value = entry.dIP
-            sheet.cell(row=curRow,column=len(DataHeaders)+6).value = entry.dPort
-            sno = entry.data[0]
-            sno = sno.replace('\n    ',',')
-            timer.lap("First block written")
-            if len(entry.samples) > 0:
-                for sample in entry.samples: 
-                    for i in range(8):
-                        if len(sample) >= i + 1:
-                            if not sheet.cell(row=curRow,column=len(DataHeaders)+7+i).value:
-                                sheet.cell(row=curRow,column=len(DataHeaders)+7+i).value = sample[i]
-                            else:
-                                sheet.cell(row=curRow,column=len(DataHeaders)+7+i).value += "\n" + sample[i]
-                        else:
-                            sheet.cell(row=curRow,column=len(DataHeaders)+7+i).value = '\n    '.join(['Error',sheet.cell(row=curRow,column=33+i).value or '']).strip()
-                #Remove duplicates from the samples we just added.
-                for i in range(8):
-                    curCell = sheet.cell(row=curRow,column=len(DataHeaders)+7+i)
-                    curCell.value = '\n'.join(set(curCell.value.split('\n')))
-            timer.lap("Samples parsed")
-            #Replace commas with newlines 
-            for i in [sheetHeaders.index("Detail Source IP")+1,
-                      sheetHeaders.index("Detail Source Port")+1,
-                      sheetHeaders.index("Detail Destination IP")+1,
-                      sheetHeaders.index("Detail Destination Port")+1
-                      ]:
-                curCell = sheet.cell(row=curRow,column=i)
-                curCell.value = '\n'.join(sorted(set(curCell.value.split(','))))
-            timer.lap("Part 2")
-            #Sort multiline entries. DataHeaders can't be multiline. The first two Detail headers aren't multiline. Apply to all headers that come 2 after the last dataheader.
-            def custom_sort(item):
-                if '.' in item: #IPv4
-                    parts = item.split('.')
-                    return [int(part) for part in parts]
-                elif ':' in item: #IPv6
-                    hextets = item.split(':')
-                    if len(hextets) < 8:#Properly handle :: in ipv6 address
-                        for index, value in enumerate(hextets):
-                            if value == '':
-                                hextets[index:index+1] = ['0'] * (9 - len(hextets))
-                    
-                    return [int(hextet,16) for hextet in hextets]
-                elif item.isnumeric(): #Simple number
-                    return [int(item)]
-                else: #Text
-                    return [1]
-            #for i in range(len(DataHeaders)+4,len(sheetHeaders)+1):#range(29,41):#[29,30,31,32,33,34,35,36,37,38,39,40]:
-            for i in [sheetHeaders.index("Sample Source IPs")+1,
-                      sheetHeaders.index("Sample Source Ports")+1,
-                      sheetHeaders.index("Sample Dest IPs")+1,
-                      sheetHeaders.index("Sample Dest Ports")+1,
-                      sheetHeaders.index("Sample Physical Ports")+1,
-                      sheetHeaders.index("Sample Vlan Tags")+1,
-                      sheetHeaders.index("Sample MPLS RD")+1,
-                      sheetHeaders.index("Sample Protocol")+1
-                      ]:
-                curCell = sheet.cell(row=curRow,column=i)
-                if curCell.value:
-                    item = set(curCell.value.strip().split('\n'))
-                    if len(item) > 1:
-                        #print("---")
-                        #print(curCell.value )
-                        try:
-                            curCell.value = '\n'.join(sorted(item, key=custom_sort))
-                        except:
-                            print(f"    Error sorting file: {file} s.no: {sno} row: {curRow} column {i}({openpyxl.utils.get_column_letter(i)})")
-            timer.lap("Sorted")
-            
-            #Apply named style to the row
-            style_to_use = style_name_alt if ColorAlternateRows and curRow % 2 == 0 else style_name_base
-            for i in range(1, len(sheetHeaders) + 1):
-                sheet.cell(row=curRow, column=i).style = style_to_use
-            timer.lap("Formatting Finished")
-
-            #Format date columns as dates
-            for i in [sheetHeaders.index("Start Time")+1,sheetHeaders.index("End Time")+1]:
-                cell = sheet.cell(row=curRow,column=i)
-                
-                try:
-                    #Columns B and C are dates. Lets convert it to a proper date format.
-                    if cell.value:
-                        # Parse the date time string to a datetime object
-                        #datetime_obj = datetime.strptime(cell.value.strip(), dp_one_line_date_format)
-                        #cell.value = datetime_obj.strftime("%Y-%m-%d %H:%M:%S")
-                        lines = str(cell.value).strip().splitlines()
-                        new_lines = []
-                        for line in lines:
-                            dt = datetime.strptime(line.strip(), dp_one_line_date_format)
-                            new_lines.append(dt.strftime("%Y-%m-%d %H:%M:%S"))
-                        cell.value = "\n".join(new_lines)
-                        # Convert the datetime object to the desired format
-                        cell.number_format = "YYYY-MM-DD HH:MM:SS"
-                        
-                except Exception as err:
-                    print(f"  Error processing date at file: {file} s.no: {sno} row: {curRow} column: {i} expected: {dp_one_line_date_format} actual: '{cell.value}'")
-                    print(f"    Details: {str(err).replace(chr(10), ' | ')}")
-                    raise ValueError("Err5:Bad date")
-            timer.lap("Dates formatted")
-            timer.total("ms")
-        #Output current progress once per hundred entried processed
-        if (curRow - 1) % 100 == 0:
-            endTime = time.perf_counter()
-            print(f"    Processed {curRow - 1} of {len(rawEntries)} entries in {(endTime - startTime) * 1000:.2f} ms", end='\r', flush=True)
-            startTime = time.perf_counter()
-        curRow += 1
-        curLine += len(rawEntry.split('\n')) + 1
-    print(f"    Processed {curRow-2} of {len(rawEntries)} entries")
-    # Auto-fit columns to fit the data
-    for column in sheet.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        cellsWithData=0
-        for cell in column:
-            try:
-                #wrapped_text = textwrap.wrap(str(cell.value), width=60)  # Adjust the width as needed
-                wrapped_text = str(cell.value).strip()
-                if cell.value and len(cell.value) > 0 and cell.value != 'N/A':
-                    cellsWithData += 1
-                for line in wrapped_text.splitlines():
-                    if len(line) > max_length:
-                        max_length = len(line)
-                    
-            except Exception as e:
-                print(e)
-                pass
+            if style not in resolved:
+                template = openpyxl.cell.WriteOnlyCell(ws)
+                template.style = style
+                plain = copy.copy(template._style)
+                template.number_format = "YYYY-MM-DD HH:MM:SS"
+                resolved[style] = (plain, template._style)
+            plain, dated = resolved[style]
+            row = []
+            for i, value in enumerate(values):
+                cell = openpyxl.cell.WriteOnlyCell(ws, value)
+                cell._style = dated if value and i in self.dateColumns else plain
+                row.append(cell)
+            yield row
 
-            #Format numeric cells as numbers.
-            if type(cell.value) is str:
-                if cell.value.replace(".", "", 1).isnumeric():
-                    cell.value = float(cell.value)
-        
-        
+    def checkpoint(self):
+        self.spool.flush()
+        shards = [dict(shard, maxLength=list(shard["maxLength"]), cellsWithData=list(shard["cellsWithData"])) for shard in self.shards]
+        #Kept so close() can record the workbooks it saves in the final checkpoint.
+        self.lastCheckpoint = {"size": self.spool.tell(), "shards": shards, "pendingBlankRows": self.pendingBlankRows, "workbooks": self.workbooks}
+        return self.lastCheckpoint
+
+    def abort(self, keep=False):
+        self.spool.close()
+
+    def shard_path(self, number):
+        #The first workbook keeps the output name, the next ones are <name>_part2.xlsx and so on.
+        if number == 1:
+            return self.path
+        return self.path[:-len(self.extension)] + f"_part{number}" + self.extension
+
+    def new_workbook(self):
+        wb = openpyxl.Workbook(write_only=True)
+
+        # Alignment and border shared by both styles
+        top_align = openpyxl.styles.Alignment(vertical='top', wrapText=True)
+        border_style = openpyxl.styles.borders.Border(
+            left=openpyxl.styles.borders.Side(style='hair'),
+            right=openpyxl.styles.borders.Side(style='hair'),
+            top=openpyxl.styles.borders.Side(style='thin'),
+            bottom=openpyxl.styles.borders.Side(style='thin')
+        )
+        # Fill for alternating rows
+        alt_fill = openpyxl.styles.PatternFill(start_color=fillColor, end_color=fillColor, fill_type='solid')
+        # Named styles
+        style_normal = openpyxl.styles.NamedStyle(name=style_name_base)
+        style_normal.alignment = top_align
+        style_normal.border = border_style
+        style_alt = openpyxl.styles.NamedStyle(name=style_name_alt)
+        style_alt.alignment = top_align
+        style_alt.border = border_style
+        style_alt.fill = alt_fill
+        # Register styles once per workbook
+        for style in [style_normal, style_alt]:
+            if style.name not in wb.named_styles:
+                wb.add_named_style(style)
+        return wb
+
+    def write_shard(self, sheet, shard):
+        # Fit the columns to the data. Widths must be set before the first row is written.
+        for i in range(len(self.headers)):
+            column_letter = openpyxl.utils.get_column_letter(i + 1)
+            #The header row counts as one cell with data.
+            if self.hideEmptyColumns == False or shard["cellsWithData"][i] > 1:
+                adjusted_width = (shard["maxLength"][i] + 2) * 1.01  # Adjust the multiplier as needed
+                if adjusted_width > maxWidth: #maxWidth set near the top of the script.
+                    adjusted_width = maxWidth
+                sheet.column_dimensions[column_letter].width = adjusted_width
+            else:
+                #All cells in the column are empty. Hide the column.
+                sheet.column_dimensions[column_letter].hidden = True
+
+        #Freeze the header row
+        sheet.freeze_panes = 'A2'
 
-        if hideEmptyColumns == False or cellsWithData > 1:
-            adjusted_width = (max_length + 2) * 1.01  # Adjust the multiplier as needed
-            if adjusted_width > maxWidth: #maxWidth set near the top of the script.
-                adjusted_width = maxWidth
-            sheet.column_dimensions[column_letter].width = adjusted_width
-        else: 
-            #All cells in the column are empty. Hide the column.
-            sheet.column_dimensions[column_letter].hidden = True
-            
-    #Freeze the header row
-    sheet.freeze_panes = sheet['A2']
-
-    #Save the worksheet
+        #Make the headers bold
+        header = []
+        for value in self.headers:
+            cell = openpyxl.cell.WriteOnlyCell(sheet, value)
+            cell.font = openpyxl.styles.Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        for row in self.rows(sheet, shard["rows"] - 1):
+            sheet.append(row)
+        #Finish the sheet's xml so nothing of this shard is held while the next one is written.
+        sheet.close()
+
+    def close(self, interactive=True):
+        self.spool.seek(0)
+        sharded = len(self.shards) > 1
+        wb = None
+        for number, shard in enumerate(self.shards, 1):
+            if wb is None:
+                wb = self.new_workbook()
+            sheet = wb.create_sheet(f"Part {number}" if sharded and self.shardMode == "sheet" else None)
+            self.write_shard(sheet, shard)
+            if self.shardMode == "workbook" and number < len(self.shards):
+                if number > 1:
+                    print("    Saving to " + self.shard_path(number))
+                self.save(wb, self.shard_path(number), interactive)
+                wb = None
+        self.spool.close()
+        if self.spoolPath:
+            os.replace(self.spoolPath + ".tmp", self.spoolPath)
+        path = self.shard_path(len(self.shards)) if self.shardMode == "workbook" else self.path
+        if path != self.path:
+            print("    Saving to " + path)
+        self.save(wb, path, interactive)
+
+        #Part workbooks saved by an earlier run that needed more of them would look like part of this output.
+        #Only the ones recorded in its checkpoint are removed, as <name>_partN.xlsx may be the output of another report.
+        if self.shardMode == "workbook":
+            workbooks = max(self.workbooks, self.leftover.get("workbooks", 0) if self.leftover else 0)
+            for number in range(len(self.shards) + 1, workbooks + 1):
+                if os.path.exists(self.shard_path(number)):
+                    os.remove(self.shard_path(number))
+            self.workbooks = len(self.shards)
+            if self.lastCheckpoint is not None:
+                self.lastCheckpoint["workbooks"] = self.workbooks
+
+    def save(self, wb, path, interactive=True):
+        #Build the workbook next to the destination, then move it into place.
+        #Write-only workbooks can only be saved once, so a retry only needs to repeat the move.
+        tmpPath = path + ".tmp"
+        wb.save(tmpPath)
+        replace_file(tmpPath, path, interactive)
+
+def replace_file(tmpPath, path, interactive=True):
+    #Move a finished output file into place. If the destination is locked (e.g. open in Excel) ask to retry,
+    #unless running non-interactively, in which case the error is raised.
     retry=True
     while (retry == True):
         try:
-            outFile = file.replace(".csv",".xlsx")
-            print("    Saving to " + output_path + outFile)
-            wb.save(output_path + outFile)
+            os.replace(tmpPath, path)
             print("    Saved successfully!")
             retry = False
         except Exception as e:
-            print(f'\n  Error writing to {output_path + outFile}\n    {e}')
+            print(f'\n  Error writing to {path}\n    {e}')
+            if not interactive:
+                os.remove(tmpPath)
+                raise
             print("  Please make sure the document is not currently open!")
             print("  Press enter to retry. Press any other key to abort")
             strInput = input()
             if len(strInput) > 0:
+                os.remove(tmpPath)
                 retry = False
-        except:
-            print("  Write failed")
-            retry = False
+
+def resume_file(path, tmpPath, size):
+    #Pick up an output from a checkpoint. An unfinished .tmp file from an interrupted run is used if there is one,
+    #otherwise a copy of the finished output. Anything written after the checkpoint is cut off.
+    if not os.path.exists(tmpPath):
+        shutil.copyfile(path, tmpPath)
+    os.truncate(tmpPath, size)
+
+def to_text(value):
+    #Cell value as plain text for the text based formats.
+    value = to_cell(value)
+    if value is None:
+        return ''
+    if type(value) is datetime:
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+class clsCsvWriter:
+    #One line per entry in a plain .csv file with the same columns as the spreadsheet.
+    extension = ".csv"
+    resumable = True
+
+    def __init__(self, headers, path, resumable=False, state=None, options=None):
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        if state:
+            resume_file(path, self.tmpPath, state["size"])
+            self.file = open(self.tmpPath, 'a', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+        else:
+            self.file = open(self.tmpPath, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(headers)
+
+    def append(self, values, style=None):
+        if values:
+            self.writer.writerow([to_text(value) for value in values])
+
+    def checkpoint(self):
+        self.file.flush()
+        return {"size": self.file.tell()}
+
+    def close(self, interactive=True):
+        self.file.close()
+        replace_file(self.tmpPath, self.path, interactive)
+
+    def abort(self, keep=False):
+        self.file.close()
+        if not keep:
+            os.remove(self.tmpPath)
+
+class clsJsonlWriter:
+    #JSON Lines: one object per entry, keyed by column header. Empty columns are left out.
+    extension = ".jsonl"
+    resumable = True
+
+    def __init__(self, headers, path, resumable=False, state=None, options=None):
+        self.headers = headers
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        if state:
+            resume_file(path, self.tmpPath, state["size"])
+            self.file = open(self.tmpPath, 'a', encoding='utf-8')
+        else:
+            self.file = open(self.tmpPath, 'w', encoding='utf-8')
+
+    def append(self, values, style=None):
+        if not values:
+            return
+        record = {}
+        for header, value in zip(self.headers, values):
+            value = to_cell(value)
+            if value is None:
+                continue
+            if type(value) is datetime:
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            record[header] = value
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+
+    def checkpoint(self):
+        self.file.flush()
+        return {"size": self.file.tell()}
+
+    def close(self, interactive=True):
+        self.file.close()
+        replace_file(self.tmpPath, self.path, interactive)
+
+    def abort(self, keep=False):
+        self.file.close()
+        if not keep:
+            os.remove(self.tmpPath)
+
+class clsSqliteWriter:
+    #A local SQLite database with one 'entries' table. Rows are inserted in batches with executemany,
+    #one transaction per batch. Column affinity follows ColumnTypes.
+    extension = ".sqlite"
+    resumable = True
+    batchRows = 5000
+
+    def __init__(self, headers, path, resumable=False, state=None, options=None):
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        self.insert = f'INSERT INTO entries VALUES ({", ".join("?" * len(headers))})'
+        self.columnCount = len(headers)
+        self.pending = []
+        if state:
+            #Rows are only ever added, so rowid gives their order. Drop any added after the checkpoint.
+            if not os.path.exists(self.tmpPath):
+                shutil.copyfile(path, self.tmpPath)
+            self.db = sqlite3.connect(self.tmpPath)
+            with self.db:
+                self.db.execute('DELETE FROM entries WHERE rowid > ?', (state["rows"],))
+            self.rowCount = state["rows"]
+            return
+        if os.path.exists(self.tmpPath):
+            os.remove(self.tmpPath)
+        self.db = sqlite3.connect(self.tmpPath)
+        affinity = {"int": "INTEGER", "float": "REAL"}
+        columns = ", ".join(f'"{header}" {affinity.get(ColumnTypes.get(header), "TEXT")}' for header in headers)
+        self.db.execute(f'CREATE TABLE entries ({columns})')
+        self.rowCount = 0
+
+    def append(self, values, style=None):
+        if not values:
+            return
+        row = []
+        for value in values:
+            value = to_cell(value)
+            if type(value) is datetime:
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            row.append(value)
+        row += [None] * (self.columnCount - len(row))
+        self.pending.append(row)
+        if len(self.pending) >= self.batchRows:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany(self.insert, self.pending)
+        self.rowCount += len(self.pending)
+        self.pending = []
+
+    def checkpoint(self):
+        self.flush()
+        return {"rows": self.rowCount}
+
+    def close(self, interactive=True):
+        self.flush()
+        self.db.close()
+        replace_file(self.tmpPath, self.path, interactive)
+
+    def abort(self, keep=False):
+        self.db.close()
+        if not keep:
+            os.remove(self.tmpPath)
+
+class clsParquetWriter:
+    #Parquet file written in row groups through pyarrow, if it is installed. Every column is stored as text,
+    #the same as the .csv output, because a column can mix numbers with error markers from corrupt entries.
+    #A finished Parquet file can't be added to, so it is always rewritten in full.
+    extension = ".parquet"
+    resumable = False
+    batchRows = 10000
+
+    def __init__(self, headers, path, resumable=False, state=None, options=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is not installed. Please install it by running: pip install pyarrow")
+        self.pa = pyarrow
+        self.headers = headers
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        self.schema = pyarrow.schema([(header, pyarrow.string()) for header in headers])
+        self.writer = pyarrow.parquet.ParquetWriter(self.tmpPath, self.schema)
+        self.columns = [[] for _ in headers]
+
+    def append(self, values, style=None):
+        if not values:
+            return
+        for i, column in enumerate(self.columns):
+            column.append(to_text(values[i]) or None if i < len(values) else None)
+        if len(self.columns[0]) >= self.batchRows:
+            self.flush()
+
+    def flush(self):
+        if self.columns[0]:
+            self.writer.write_table(self.pa.Table.from_arrays([self.pa.array(column, self.pa.string()) for column in self.columns], schema=self.schema))
+            self.columns = [[] for _ in self.headers]
+
+    def close(self, interactive=True):
+        self.flush()
+        self.writer.close()
+        replace_file(self.tmpPath, self.path, interactive)
+
+    def abort(self, keep=False):
+        self.writer.close()
+        os.remove(self.tmpPath)
+
+#Output formats that can be picked with --format. Only the formats asked for are created, so the XLSX styling,
+#autofit and hidden column work only happens when xlsx is one of them.
+OutputWriters = {
+    "xlsx": clsXlsxWriter,
+    "csv": clsCsvWriter,
+    "jsonl": clsJsonlWriter,
+    "sqlite": clsSqliteWriter,
+    "parquet": clsParquetWriter}
+
+#Identify date format:
+# Regex for dates like 13.09.2024 00:09:35 or 09.13.2024 12:00:00
+date_regex = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})\s+(\d{2}):(\d{2}):(\d{2})')
+
+def entry_date_format(rawEntry):
+    #The date format of the first unambiguous date in an entry, or None if all its dates could be either.
+    #Dates are in the data rows, so skip any samples.
+    samplesAt = rawEntry.find('SAMPLE DETAILS:')
+    if samplesAt >= 0:
+        rawEntry = rawEntry[:samplesAt]
+    for match in date_regex.finditer(rawEntry):
+        d1, d2, year, h, m, s = match.groups()
+        d1 = int(d1)
+        d2 = int(d2)
+
+        # Check for unambiguous day/month
+        if d1 > 12 and d2 <= 12:
+            return "%d.%m.%Y %H:%M:%S"
+        elif d2 > 12 and d1 <= 12:
+            return "%m.%d.%Y %H:%M:%S"
+        elif d1 > 12 and d2 > 12:
+            # Technically invalid date, skip
+            continue
+    return None
+
+def detect_date_format(stream, startLine=1, positions=None):
+    #Look at the entries from the stream's current position and stop at the first unambiguous date.
+    #Returns (date format, whether it was found rather than guessed, iterator over all the entries from that position,
+    #see iter_raw_entries). Falls back to month first if no date tells.
+    #A seekable stream is scanned as far as it takes, up to the end, and rewound, so only one entry is held in memory at
+    #a time. Entries read from other streams are buffered and handed back, so only the first dateLookahead entries, up
+    #to dateLookaheadBytes of them, are looked at.
+    dateFormat = None
+    try:
+        start = stream.tell() if stream.seekable() else None
+    except OSError:
+        start = None
+    if start is not None:
+        for rawEntry, curLine in iter_raw_entries(stream, startLine):
+            dateFormat = entry_date_format(rawEntry)
+            if dateFormat:
+                break
+        stream.seek(start)
+        return dateFormat or "%m.%d.%Y %H:%M:%S", dateFormat is not None, iter_raw_entries(stream, startLine, positions)
+
+    entries = iter_raw_entries(stream, startLine, positions)
+    buffered = []
+    size = 0
+    for item in entries:
+        buffered.append(item)
+        size += len(item[0])
+        dateFormat = entry_date_format(item[0])
+        if dateFormat or len(buffered) >= dateLookahead or size >= dateLookaheadBytes:
+            break
+
+    # Default fallback (common case)
+    return dateFormat or "%m.%d.%Y %H:%M:%S", dateFormat is not None, itertools.chain(buffered, entries)
+
+class clsTimestampConverter:
+    #Converts Start/End Time text to datetime objects.
+    #The report only uses two layouts, DD.MM.YYYY HH:MM:SS and MM.DD.YYYY HH:MM:SS, so the fields are sliced out
+    #directly instead of going through strptime. Anything else falls back to strptime.
+    #Many attacks start in the same second, so results are cached.
+    cacheSize = 100000
+
+    def __init__(self, dateFormat):
+        self.dateFormat = dateFormat
+        self.dayFirst = dateFormat.startswith("%d")
+        self.cache = {}
+
+    def convert(self, text):
+        value = self.cache.get(text)
+        if value is None:
+            if len(self.cache) > self.cacheSize:
+                self.cache.clear()
+            if len(text) == 19 and text[2] == '.' and text[5] == '.' and text[10] == ' ' and text[13] == ':' and text[16] == ':' \
+                    and (text[:2] + text[3:5] + text[6:10] + text[11:13] + text[14:16] + text[17:]).isdecimal():
+                first, second = int(text[:2]), int(text[3:5])
+                day, month = (first, second) if self.dayFirst else (second, first)
+                value = datetime(int(text[6:10]), month, day, int(text[11:13]), int(text[14:16]), int(text[17:]))
+            else:
+                value = datetime.strptime(text.strip(), self.dateFormat)
+            self.cache[text] = value
+        return value
+
+#One converter per process and date format, so its cache carries over between entries and batches.
+timestampConverters = {}
+
+def get_timestamp_converter(dateFormat):
+    if dateFormat not in timestampConverters:
+        timestampConverters[dateFormat] = clsTimestampConverter(dateFormat)
+    return timestampConverters[dateFormat]
+
+#IPv6 sample addresses are stored as their integer value with this bit set, so they sort after all IPv4 addresses
+#and can't collide with them.
+IPV6_FLAG = 1 << 128
+
+class clsSampleAggregator:
+    #Combines the SAMPLE DETAILS rows of an entry into one cell per sample column.
+    #Each distinct value is converted once to a typed sort key: IPv4/IPv6 addresses become integers, ports and VLANs
+    #become ints and everything else an interned string. The conversions are cached across entries because the same
+    #addresses and ports show up in many entries.
+    #With limit set, only the limit most frequent values of a column are kept, each with its count, followed by a
+    #'+N more' line.
+    cacheSize = 200000
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.kinds = [SheetColumnTypes[column] for column in sampleColumns]
+        self.keys = [{} for _ in sampleColumns]     #text -> sort key
+        self.texts = [{} for _ in sampleColumns]    #sort key -> text as first seen
+
+    def key(self, i, text):
+        keys = self.keys[i]
+        key = keys.get(text)
+        if key is None:
+            kind = self.kinds[i]
+            key = None
+            if kind == "ip":
+                try:
+                    ip = ipaddress.ip_address(text)
+                    key = int(ip) if ip.version == 4 else int(ip) | IPV6_FLAG
+                except ValueError:
+                    pass
+            elif kind == "int" and text.isdecimal():
+                key = int(text)
+            if key is None:
+                key = sys.intern(text)
+            keys[text] = key
+            self.texts[i].setdefault(key, text)
+        return key
+
+    def aggregate(self, samples):
+        #Returns the cell values for the sample columns. Rows with missing columns add an 'Error' value.
+        #Full caches are only cleared between entries, as cell() needs the text of every key counted for this one.
+        for i, keys in enumerate(self.keys):
+            if len(keys) > self.cacheSize:
+                keys.clear()
+                self.texts[i].clear()
+        counts = [{} for _ in sampleColumns]
+        for sample in samples:
+            for i in range(len(sampleColumns)):
+                if i < len(sample):
+                    text = sample[i]
+                    if text == '':
+                        continue
+                    key = self.key(i, text)
+                else:
+                    key = 'Error'
+                counts[i][key] = counts[i].get(key, 0) + 1
+        return [self.cell(i, columnCounts) for i, columnCounts in enumerate(counts)]
+
+    def cell(self, i, counts):
+        if not counts:
+            return None
+        texts = self.texts[i]
+        if len(counts) == 1:
+            key = next(iter(counts))
+            #A single port or VLAN is written as a number.
+            if type(key) is int and self.kinds[i] == "int":
+                return key
+            return texts.get(key, key)
+        truncated = self.limit and len(counts) > self.limit
+        if truncated:
+            keys = [key for key, count in heapq.nlargest(self.limit, counts.items(), key=lambda item: item[1])]
+        else:
+            keys = counts
+        #Typed values first in numeric order, then text values alphabetically.
+        ordered = sorted(key for key in keys if type(key) is int) + sorted(key for key in keys if type(key) is str)
+        if not truncated:
+            return '\n'.join([texts.get(key, key) for key in ordered])
+        lines = [f"{texts.get(key, key)} ({counts[key]})" for key in ordered]
+        lines.append(f"+{len(counts) - self.limit} more")
+        return '\n'.join(lines)
+
+#One aggregator per process and limit, so its caches carry over between entries and batches.
+sampleAggregators = {}
+
+def get_sample_aggregator(limit=0):
+    if limit not in sampleAggregators:
+        sampleAggregators[limit] = clsSampleAggregator(limit)
+    return sampleAggregators[limit]
+
+def process_entry(rawEntry, curLine, curRow, dp_one_line_date_format, file, options=None):
+    #Turn one raw entry into a finished output row. Returns (style, row).
+    #Error rows have no style and hold only the error in column A. Empty entries give an empty row.
+    #Everything needed is passed in so this can run in a worker process.
+    if len(rawEntry) == 0:
+        return None, []
+    options = options or clsOptions()
+    start = time.perf_counter()
+    #Populate entry with the desired data. See class clsEntry.
+    entry = clsEntry(rawEntry, curLine)
+    start = metrics.lap("parse", start)
+
+    if entry.error:
+        return None, [entry.error]
     
+    #For troubleshooting, enable the following rows:
+    #print(f'Processing Attack ID: {entry.defaultHeader[8]} S.No: {entry.defaultHeader}')
+    #print(f'=============\n{rawEntry}\n==================')
+
+    #Build the whole row in memory before handing it to the writer.
+    row = entry.data + [
+        entry.footprint,
+        entry.state,
+        entry.sIP,
+        entry.sPort,
+        entry.dIP,
+        entry.dPort]
+    sno = str(to_cell(entry.data[0]))
+    sno = sno.replace('\n    ',',')
+    #Deduplicate and sort the samples. See class clsSampleAggregator.
+    metrics.counts["samples"] += len(entry.samples)
+    row += get_sample_aggregator(options.sampleLimit).aggregate(entry.samples)
+    start = metrics.lap("samples", start)
+    #Replace commas with newlines 
+    for column in detailListColumns:
+        row[column] = '\n'.join(sorted(set(row[column].split(','))))
+    #Single values in the detail columns get the type of their column. Lists stay as text.
+    for column in detailListColumns:
+        if row[column] and '\n' not in row[column]:
+            row[column] = parse_value(row[column], SheetColumnTypes[column])
+    start = metrics.lap("details", start)
+
+    #Format date columns as dates
+    timestamps = get_timestamp_converter(dp_one_line_date_format)
+    for column in dateColumns:
+        try:
+            #Columns B and C are dates. Parse them to datetime objects. The writer decides how they are shown.
+            if type(row[column]) is tuple:
+                row[column] = tuple(timestamps.convert(line) for line in row[column])
+            elif row[column]:
+                row[column] = timestamps.convert(row[column])
+                
+        except Exception as err:
+            print(f"  Error processing date at file: {file} s.no: {sno} row: {curRow} column: {column+1} expected: {dp_one_line_date_format} actual: '{to_cell(row[column])}'")
+            print(f"    Details: {str(err).replace(chr(10), ' | ')}")
+            metrics.errors["Err5"] += 1
+            raise ValueError("Err5:Bad date")
+    metrics.lap("dates", start)
+
+    #Apply named style to the row
+    style_to_use = style_name_alt if options.colorAlternateRows and curRow % 2 == 0 else style_name_base
+    return style_to_use, row
+
+def process_batch(batch, dp_one_line_date_format, file, options):
+    #Worker entry point. batch is a list of (rawEntry, curLine, curRow).
+    #Returns the rows along with the metrics gathered while making them, to be merged by the main process.
+    metrics.reset()
+    rows = [process_entry(rawEntry, curLine, curRow, dp_one_line_date_format, file, options) for rawEntry, curLine, curRow in batch]
+    return rows, metrics.take()
+
+class clsManifest:
+    #Record of how far each input has been processed, kept in the output folder. It is a small SQLite database so
+    #several jobs can update it at once. Each input's checkpoint is stored as JSON next to its size, mtime and hash.
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=60)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS manifest (source TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT, complete INTEGER, state TEXT)')
+
+    def get(self, source):
+        row = self.db.execute('SELECT state FROM manifest WHERE source = ?', (source,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, source, state):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?)', (source, state["size"], state["mtime"], state.get("hash"), int(state["complete"]), json.dumps(state)))
+
+    def close(self):
+        self.db.close()
+
+def is_unchanged(state, inPath, formats, outPaths):
+    #True if a finished input has the same size and modification time as when it was processed,
+    #with the same output formats still in place. Nothing needs to be read to tell.
+    if not state or not state["complete"] or state["formats"] != list(formats):
+        return False
+    stat = os.stat(inPath)
+    return stat.st_size == state["size"] and stat.st_mtime == state["mtime"] and all(os.path.exists(outPath) for outPath in outPaths)
 
-if not os.path.exists(input_path):
-    print("input subfolder not found. It will be created for you.")
-    os.makedirs(input_path)
+class clsCheckpoint:
+    #Saves progress through one input file to the manifest. state is the saved checkpoint this run continues from,
+    #or None to start from the beginning. A checkpoint is only used if the input up to it hasn't changed, which is
+    #checked against a hash of that part of the file.
+    #Positions are the text file's tell() values, which are byte offsets for the encodings reports are written in.
+    def __init__(self, manifestPath, inPath, formats, outBase):
+        self.manifest = clsManifest(manifestPath)
+        self.inPath = inPath
+        self.formats = list(formats)
+        self.hasher = hashlib.sha256()
+        self.hashed = 0
+        self.input = open(inPath, 'rb')
+        self.state = self.manifest.get(inPath)
+        self.previous = self.state #Kept when starting over, so outputs can tidy up what the last run left
+        if self.state and not self.usable(outBase):
+            self.restart()
 
-if not os.path.exists(output_path):
-    os.makedirs(output_path)
+    def restart(self):
+        #Ignore the saved checkpoint and process the input from the beginning.
+        self.state = None
+        self.hasher = hashlib.sha256()
+        self.hashed = 0
+        self.input.seek(0)
 
-for path, dir, files in os.walk(input_path):
-    if path in ['./input/noprocess','./input/ignore','./input/old']:
-        continue
-    if len(files) == 0:
-        print("Please place DefenseProForensicReport.csv files in the ./input/ folder and rerun the script.")
-    for file in files:
-        if file.endswith(".tgz") or file.endswith(".zip"):
+    def usable(self, outBase):
+        state = self.state
+        if state.get("offset") is None or state["formats"] != self.formats or os.path.getsize(self.inPath) < state["offset"]:
+            return False
+        for outputFormat in self.formats:
+            outPath = outBase + OutputWriters[outputFormat].extension
+            if outputFormat == "xlsx":
+                outPath += ".rows"
+            if not os.path.exists(outPath) and not os.path.exists(outPath + ".tmp"):
+                return False
+        return self.hash_to(state["offset"]) == state["prefixHash"]
+
+    def hash_to(self, offset):
+        #Hash the input up to offset, carrying on from where the last call stopped.
+        while self.hashed < offset:
+            chunk = self.input.read(min(1 << 20, offset - self.hashed))
+            if not chunk:
+                break
+            self.hasher.update(chunk)
+            self.hashed += len(chunk)
+        return self.hasher.hexdigest()
+
+    def save(self, offset, line, entries, dateFormat, dateDetected, outputs, complete=False):
+        #dateDetected is False when dateFormat is only the month first fallback, so a later run looks at its new entries again.
+        stat = os.stat(self.inPath)
+        state = {"size": stat.st_size, "mtime": stat.st_mtime, "offset": offset, "prefixHash": self.hash_to(offset),
+                 "line": line, "entries": entries, "dateFormat": dateFormat, "dateDetected": dateDetected, "formats": self.formats,
+                 "outputs": outputs, "complete": complete}
+        self.manifest.put(self.inPath, state)
+        return state
+
+    def complete(self, state):
+        #All outputs are in place. Record the whole file's hash so the next run can tell it apart from a changed one.
+        hasher = self.hasher.copy()
+        size = self.hashed
+        for chunk in iter(lambda: self.input.read(1 << 20), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+        state.update(size=size, mtime=os.stat(self.inPath).st_mtime, hash=hasher.hexdigest(), complete=True)
+        self.manifest.put(self.inPath, state)
+
+    def close(self):
+        self.input.close()
+        self.manifest.close()
+
+#Columns of the attack index that are copied from the output row, and the row header each comes from.
+IndexColumns = {
+    "sno": "S.No",
+    "start_time": "Start Time",
+    "end_time": "End Time",
+    "attack_id": "Attack ID",
+    "radware_id": "Radware ID",
+    "policy": "Policy Name",
+    "attack_name": "Attack Name",
+    "device_ip": "Device IP Address",
+    "source_ip": "Source IP Address",
+    "destination_ip": "Destination IP Address"}
+#Output columns whose IP addresses are indexed, and the role and origin recorded for them.
+IndexIpColumns = [
+    (sheetHeaders.index("Source IP Address"), "source", "entry"),
+    (sheetHeaders.index("Destination IP Address"), "destination", "entry"),
+    (sheetHeaders.index("Detail Source IP"), "source", "detail"),
+    (sheetHeaders.index("Detail Destination IP"), "destination", "detail"),
+    (sheetHeaders.index("Sample Source IPs"), "source", "sample"),
+    (sheetHeaders.index("Sample Dest IPs"), "destination", "sample")]
+
+#Standard text form of each address seen by normalize_ip, or None if it is not an address.
+#Cached because the same addresses show up in many entries. Cleared when it grows past ipCacheSize.
+ipTexts = {}
+ipCacheSize = 200000
+
+def normalize_ip(text):
+    #The address in text in its standard form, e.g. IPv6 compressed and lower case, so the same address always
+    #matches. inet_pton/inet_ntop do this much faster than the ipaddress module for the number of sample addresses.
+    ip = ipTexts.get(text, False)
+    if ip is False:
+        if len(ipTexts) > ipCacheSize:
+            ipTexts.clear()
+        ip = None
+        for family in (socket.AF_INET, socket.AF_INET6):
             try:
-                print("zip/tgz file support to be added later. let Steve Harris know if this is a feature that would be helpful for you.\r    " + file)
-            except Exception as err:
-                print(f'Error processing {input_path + file} {err}')
-        elif file.endswith(".csv"):
-            print("Processing" + input_path + file)
-            with open(input_path + file, 'r') as f:
-                rawData = f.read()
-                outFile = file.replace(".csv",".xlsx")
-                if replaceExistingFile or not os.path.exists(output_path + outFile):
-                    processData(rawData)
+                ip = socket.inet_ntop(family, socket.inet_pton(family, text))
+                break
+            except (OSError, ValueError):
+                pass
+        ipTexts[text] = ip
+    return ip
+
+def cell_ips(value):
+    #IP addresses in an output cell, in their standard text form. Counts added by --max-sample-values,
+    #'+N more' lines and anything else that is not an address are skipped.
+    if value is None or value == '':
+        return []
+    if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return [normalize_ip(str(value))]
+    ips = []
+    for item in (value if type(value) is tuple else str(value).split('\n')):
+        ip = normalize_ip(str(item).strip().split(' ', 1)[0])
+        if ip:
+            ips.append(ip)
+    return ips
+
+class clsAttackIndex:
+    #Index of the attacks in every report processed, in a SQLite database in the output folder. Entries are looked up
+    #by Attack ID, Radware ID, Policy Name, time and any source or destination IP without opening the reports.
+    #A report's rows are replaced when it is processed again, and only those from the resume point on when a grown
+    #report is continued, so the index is kept up to date one report at a time and never needs rebuilding.
+    batchRows = 2000
+
+    def __init__(self, path, source):
+        self.db = sqlite3.connect(path, timeout=60)
+        #WAL lets queries run while reports are being added, and several jobs add reports at once.
+        #Most of the time goes on keeping the IP index in order, which a larger page cache helps with.
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA cache_size=-65536')
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY, source TEXT UNIQUE, updated TEXT)')
+            columns = ", ".join(f"{column} {'INTEGER' if column in ('sno', 'radware_id') else 'TEXT'}" for column in IndexColumns)
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS entries (report INTEGER, row INTEGER, {columns}, PRIMARY KEY (report, row))')
+            self.db.execute('CREATE TABLE IF NOT EXISTS ips (ip TEXT, role TEXT, origin TEXT, report INTEGER, row INTEGER)')
+            for column in ("attack_id", "radware_id", "policy", "start_time", "end_time"):
+                self.db.execute(f'CREATE INDEX IF NOT EXISTS entries_{column} ON entries ({column})')
+            self.db.execute('CREATE INDEX IF NOT EXISTS ips_ip ON ips (ip, role)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS ips_entry ON ips (report, row)')
+            self.db.execute('INSERT OR IGNORE INTO reports (source) VALUES (?)', (source,))
+        self.report = self.db.execute('SELECT id FROM reports WHERE source = ?', (source,)).fetchone()[0]
+        #False if the report has not been indexed before, in which case it has to be read in full.
+        self.indexed = self.db.execute('SELECT 1 FROM entries WHERE report = ? LIMIT 1', (self.report,)).fetchone() is not None
+        self.indexColumns = [sheetHeaders.index(header) for header in IndexColumns.values()]
+        self.insert = f'INSERT OR REPLACE INTO entries VALUES (?, ?, {", ".join("?" * len(IndexColumns))})'
+        self.entries = []
+        self.ips = []
+
+    def begin(self, fromRow=2):
+        #Drop what was indexed for the report from fromRow on. Row 2 is the first entry.
+        with self.db:
+            self.db.execute('DELETE FROM entries WHERE report = ? AND row >= ?', (self.report, fromRow))
+            self.db.execute('DELETE FROM ips WHERE report = ? AND row >= ?', (self.report, fromRow))
+
+    def append(self, curRow, values):
+        #Error rows and empty entries have nothing to index.
+        if len(values) < len(sheetHeaders):
+            return
+        entry = [self.report, curRow]
+        for column in self.indexColumns:
+            value = to_cell(values[column])
+            if type(value) is datetime:
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            elif value is not None and type(value) is not int:
+                value = str(value)
+            entry.append(value)
+        self.entries.append(entry)
+        for column, role, origin in IndexIpColumns:
+            for ip in cell_ips(values[column]):
+                self.ips.append((ip, role, origin, self.report, curRow))
+        if len(self.entries) >= self.batchRows:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany(self.insert, self.entries)
+            self.db.executemany('INSERT INTO ips VALUES (?, ?, ?, ?, ?)', self.ips)
+        self.entries = []
+        self.ips = []
+
+    def close(self):
+        self.flush()
+        with self.db:
+            self.db.execute('UPDATE reports SET updated = ? WHERE id = ?', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), self.report))
+        self.db.close()
+
+    def abort(self):
+        #Rows already flushed stay. The next run of the report replaces them.
+        self.db.close()
+
+def indexed_sources(path):
+    #Reports that have entries in the attack index.
+    if not os.path.exists(path):
+        return set()
+    db = sqlite3.connect(path, timeout=60)
+    try:
+        return {source for (source,) in db.execute('SELECT source FROM reports WHERE EXISTS (SELECT 1 FROM entries WHERE entries.report = reports.id)')}
+    except sqlite3.OperationalError:
+        return set()
+    finally:
+        db.close()
+
+def print_query_results(results):
+    #Matching entries as a table, one line each.
+    columns = ["report", "row", "sno", "start_time", "end_time", "attack_id", "radware_id", "policy", "attack_name", "source_ip", "destination_ip"]
+    table = [columns] + [["" if result[column] is None else str(result[column]) for column in columns] for result in results]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip())
+
+def query_index(path, ip=None, sourceIp=None, destinationIp=None, attackId=None, radwareId=None, policy=None, start=None, end=None, report=None, limit=100):
+    #Entries in the attack index matching all of the filters given, as a list of dicts in report and row order.
+    #start and end select entries active at any time between them. Times are 'YYYY-MM-DD HH:MM:SS' or just the date.
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    where = []
+    parameters = []
+    for address, role in ((ip, None), (sourceIp, "source"), (destinationIp, "destination")):
+        if address:
+            if normalize_ip(address) is None:
+                raise ValueError(f"'{address}' is not an IP address")
+            address = normalize_ip(address)
+            #Look the address up first, then its entries by key, rather than checking every entry for it.
+            if role:
+                where.append('(entries.report, entries.row) IN (SELECT report, row FROM ips WHERE ip = ? AND role = ?)')
+                parameters += [address, role]
+            else:
+                where.append('(entries.report, entries.row) IN (SELECT report, row FROM ips WHERE ip = ?)')
+                parameters.append(address)
+    for column, value in (("attack_id", attackId), ("radware_id", radwareId), ("policy", policy)):
+        if value is not None:
+            where.append(f'entries.{column} = ?')
+            parameters.append(value)
+    if start:
+        where.append('entries.end_time >= ?')
+        parameters.append(start)
+    if end:
+        where.append('entries.start_time <= ?')
+        parameters.append(end if len(end) > 10 else end + " 23:59:59")
+    if report:
+        where.append('reports.source LIKE ?')
+        parameters.append(f"%{report}%")
+    columns = ", ".join("entries." + column for column in IndexColumns)
+    sql = f'SELECT reports.source, entries.row, {columns} FROM entries JOIN reports ON reports.id = entries.report {"WHERE " + " AND ".join(where) if where else ""} ORDER BY entries.report, entries.row LIMIT ?'
+    cursor = db.execute(sql, parameters + [limit])
+    results = [dict(zip(["report", "row"] + list(IndexColumns), row)) for row in cursor]
+    db.close()
+    return results
+
+def processData(f, file, outBase, options=None, checkpoint=None, index=None, writers=None):
+    #Convert one report into each of the output formats in options (see clsOptions). file is only used to label messages.
+    #outBase is the output path without an extension. Returns the number of entries processed.
+    #Instead of the formats, rows can go to a list of writers, any objects with the same methods as the output writers.
+    #Progress lines and the retry prompt are skipped when not interactive, e.g. when running in a batch worker.
+    #With a checkpoint (see clsCheckpoint) progress is saved to the manifest as it goes, and a run picks up from
+    #the checkpoint's saved state if it has one.
+    #Timings and counts for the file are gathered in metrics and written to <outBase>.metrics.json or .prom if asked for.
+    #With an index (see clsAttackIndex) each row is also added to the attack index.
+    options = options or clsOptions()
+    interactive = options.interactive
+    formats = options.formats
+    metrics.reset()
+    fileStart = time.perf_counter()
+    start = fileStart
+
+    resume = checkpoint.state if checkpoint else None
+    positions = collections.deque() if checkpoint else None
+    entryCount = 0
+    if resume:
+        print(f"    Continuing from line {resume['line']} after {resume['entries']} entries")
+        f.seek(resume["offset"])
+        entryCount = resume["entries"]
+        dp_one_line_date_format = resume["dateFormat"]
+        dateDetected = resume.get("dateDetected", False)
+        if dateDetected:
+            rawEntries = iter_raw_entries(f, resume["line"], positions)
+        else:
+            #The saved format was only the fallback. Look at the new entries, and start over if they show it was wrong.
+            dateFormat, dateDetected, rawEntries = detect_date_format(f, resume["line"], positions)
+            if dateDetected and dateFormat != dp_one_line_date_format:
+                print("    The new entries show the dates are not month first. Starting from the beginning")
+                checkpoint.restart()
+                resume = None
+                entryCount = 0
+                positions.clear()
+                if index:
+                    index.begin(2)
+                f.seek(0)
+                dp_one_line_date_format, dateDetected, rawEntries = detect_date_format(f, 1, positions)
+    else:
+        dp_one_line_date_format, dateDetected, rawEntries = detect_date_format(f, 1, positions)
+    start = metrics.lap("detect", start)
+
+    #Stream the entries from the input file, processing the data within and building a row for our output sheet.
+    if writers is None:
+        writers = []
+        try:
+            for outputFormat in formats:
+                if outputFormat not in OutputWriters:
+                    raise ValueError(f"Unknown output format '{outputFormat}'. Choose from {', '.join(OutputWriters)}")
+                writerClass = OutputWriters[outputFormat]
+                state = resume["outputs"][outputFormat] if resume else None
+                writer = writerClass(sheetHeaders, outBase + writerClass.extension, checkpoint is not None, state, options)
+                if checkpoint and checkpoint.previous and not resume:
+                    writer.leftover = checkpoint.previous["outputs"].get(outputFormat)
+                writers.append(writer)
+        except:
+            for writer in writers:
+                writer.abort(checkpoint is not None)
+            raise
+    metrics.lap("open", start)
+
+    line_count = 0
+    starts = collections.deque()
+    def numbered_entries():
+        #Row numbers are fixed by input position so the alternating row style matches the single process run.
+        nonlocal entryCount, line_count
+        start = time.perf_counter()
+        for rawEntry, curLine in rawEntries:
+            metrics.lap("split", start)
+            entryCount += 1
+            metrics.counts["entries"] += 1
+            #Reports are plain ASCII, so characters are bytes.
+            metrics.counts["bytes"] += len(rawEntry)
+            line_count = curLine + rawEntry.count('\n')
+            if checkpoint:
+                starts.append((positions.popleft(), curLine))
+            yield rawEntry, curLine, entryCount + 1
+            start = time.perf_counter()
+
+    if options.workers > 1:
+        results = parallel_rows(numbered_entries(), dp_one_line_date_format, file, options)
+    else:
+        results = (process_entry(rawEntry, curLine, curRow, dp_one_line_date_format, file, options) for rawEntry, curLine, curRow in numbered_entries())
+
+    def save_checkpoint(entryStart, curRow):
+        #Everything before the entry at entryStart has been written. Outputs are flushed so the state can be picked up later.
+        start = time.perf_counter()
+        offset, line = entryStart
+        outputs = {outputFormat: writer.checkpoint() for outputFormat, writer in zip(formats, writers)}
+        state = checkpoint.save(offset, line, curRow - 2, dp_one_line_date_format, dateDetected, outputs)
+        metrics.lap("checkpoint", start)
+        return state
+
+    curRow = 2 if not resume else resume["entries"] + 2
+    held = None
+    progress = interactive and options.showProgress
+    nextProgress = time.perf_counter() + progressInterval
+    try:
+        for style, row in results:
+            start = time.perf_counter()
+            if checkpoint:
+                #Each row is held back until the next one arrives, so the last entry is always the one after the
+                #final checkpoint. A report that has grown since only needs to parse from there on.
+                if held:
+                    for writer in writers:
+                        writer.append(held[1], held[0])
+                held = (style, row, starts.popleft())
+                if (curRow - 1) % options.checkpointEntries == 0:
+                    save_checkpoint(held[2], curRow)
+            else:
+                for writer in writers:
+                    writer.append(row, style)
+            if index:
+                index.append(curRow, row)
+            now = metrics.lap("write", start)
+            #Output current progress at most once per progressInterval
+            if progress and now >= nextProgress:
+                elapsed = now - fileStart
+                print(f"    Processed {curRow - 1} entries, {metrics.counts['entries'] / elapsed:.0f} entries/s", end='\r', flush=True)
+                nextProgress = now + progressInterval
+            curRow += 1
+        final = None
+        if held:
+            final = save_checkpoint(held[2], curRow - 1)
+            for writer in writers:
+                writer.append(held[1], held[0])
+    except:
+        for writer in writers:
+            writer.abort(checkpoint is not None)
+        if index:
+            index.abort()
+        raise
+    print(f"    Processed {curRow-2} of {entryCount} entries over {line_count} lines.")
+    if metrics.errors and not verbose:
+        print("    Corrupt entries: " + ", ".join(f"{code}: {count}" for code, count in sorted(metrics.errors.items())) + ". Run with --verbose to see each one.")
+
+    #Save the outputs
+    start = time.perf_counter()
+    for writer in writers:
+        if hasattr(writer, "path"):
+            print("    Saving to " + writer.path)
+        writer.close(interactive)
+    if index:
+        index.close()
+    if final:
+        checkpoint.complete(final)
+    metrics.lap("save", start)
+    if options.metricsFormat and outBase:
+        metricsPath = outBase + (".metrics.json" if options.metricsFormat == "json" else ".prom")
+        metrics.write(metricsPath, options.metricsFormat, file, time.perf_counter() - fileStart)
+        print("    Metrics written to " + metricsPath)
+    return entryCount
+
+def is_archive(file):
+    return file.endswith((".zip", ".tgz", ".tar.gz", ".gz"))
+
+def archive_members(inPath):
+    #Names of the report .csv files inside an archive, in archive order. A plain .gz holds a single report.
+    if inPath.endswith(".zip"):
+        with zipfile.ZipFile(inPath) as archive:
+            return [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith(".csv")]
+    if inPath.endswith((".tgz", ".tar.gz")):
+        with tarfile.open(inPath, 'r:gz') as archive:
+            return [member.name for member in archive if member.isfile() and member.name.endswith(".csv")]
+    name = os.path.basename(inPath)[:-3]
+    return [name] if name.endswith(".csv") else []
+
+def member_output_base(file, member):
+    #Output name for an archive member: the archive's file name followed by the member's path within it.
+    #The archive's extension is kept, so a.zip, a.tgz and a plain a.csv next to each other never share an output.
+    #e.g. export.zip containing dp1/report.csv gives export_zip_dp1_report
+    archiveName = file.replace(".", "_")
+    if not file.endswith((".zip", ".tgz", ".tar.gz")):
+        #A plain .gz holds a single report, so report.csv.gz is just report_csv_gz.
+        return archiveName
+    memberName = os.path.splitext(member)[0].replace("\\", "/").strip("/").replace("/", "_")
+    return archiveName + "_" + memberName
+
+@contextlib.contextmanager
+def open_report(inPath, member=None):
+    #Open a report for reading as text. Archive members are decompressed and decoded as they are read,
+    #so nothing is extracted to disk.
+    if member is None:
+        with open(inPath, 'r') as f:
+            yield f
+    elif inPath.endswith(".zip"):
+        with zipfile.ZipFile(inPath) as archive, archive.open(member) as raw:
+            yield io.TextIOWrapper(raw)
+    elif inPath.endswith((".tgz", ".tar.gz")):
+        with tarfile.open(inPath, 'r:gz') as archive, archive.extractfile(member) as raw:
+            yield io.TextIOWrapper(raw)
+    else:
+        with gzip.open(inPath, 'rt') as f:
+            yield f
+
+def source_name(inPath, member=None):
+    return inPath if member is None else f"{inPath}:{member}"
+
+def process_file(inPath, file, outBase, options, member=None, manifestPath=None, indexPath=None):
+    #Convert a single input file, or one member of an archive, and report how it went as (status, entries, elapsed seconds, log).
+    #entries only counts the entries parsed by this run, so a grown report continued from its checkpoint isn't credited
+    #with the ones parsed before and the throughput worked out from it stays right.
+    #Non-interactive runs capture their console output in log so the caller can print it in one block.
+    #With a manifest, plain files are checkpointed as they are processed. Archive members and formats that can't be
+    #added to are only recorded once finished, so an unchanged input can be skipped next time.
+    #With an indexPath the report's entries are added to the attack index as well.
+    startTime = time.perf_counter()
+    entries = 0
+    formats = options.formats
+    log = io.StringIO()
+    out = contextlib.nullcontext() if options.interactive else contextlib.redirect_stdout(log)
+    with out:
+        print("Processing " + source_name(inPath, member))
+        checkpoint = None
+        try:
+            if manifestPath and member is None and all(OutputWriters[outputFormat].resumable for outputFormat in formats):
+                checkpoint = clsCheckpoint(manifestPath, inPath, formats, outBase)
+            index = None
+            if indexPath:
+                index = clsAttackIndex(indexPath, source_name(inPath, member))
+                #A report that is not in the index yet is read in full, even if its outputs could be continued.
+                if checkpoint and checkpoint.state and not index.indexed:
+                    checkpoint.restart()
+                index.begin(checkpoint.state["entries"] + 2 if checkpoint and checkpoint.state else 2)
+            with open_report(inPath, member) as f:
+                processData(f, file, outBase, options, checkpoint, index)
+            entries = metrics.counts["entries"]
+            if manifestPath and checkpoint is None:
+                stat = os.stat(inPath)
+                manifest = clsManifest(manifestPath)
+                manifest.put(source_name(inPath, member), {"size": stat.st_size, "mtime": stat.st_mtime, "formats": list(formats), "complete": True})
+                manifest.close()
+            status = "OK"
+        except Exception as err:
+            print(f"  Error processing {source_name(inPath, member)}: {err}")
+            status = f"Failed: {err}"
+        finally:
+            if checkpoint:
+                checkpoint.close()
+    return status, entries, time.perf_counter() - startTime, log.getvalue()
+
+def parallel_rows(entries, dp_one_line_date_format, file, options):
+    #Parse batches of entries across a pool of worker processes and yield the finished rows in input order.
+    #Only a few batches per worker are in flight at once so memory stays bounded on large reports.
+    def finished(future):
+        rows, snapshot = future.result()
+        metrics.merge(snapshot)
+        return rows
+
+    #Process pools are only imported when used, as concurrent.futures also imports logging.
+    import concurrent.futures
+    workers = options.workers
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=set_verbose, initargs=(verbose,)) as executor:
+        pending = collections.deque()
+        batch = []
+        for item in entries:
+            batch.append(item)
+            if len(batch) >= batchSize:
+                pending.append(executor.submit(process_batch, batch, dp_one_line_date_format, file, options))
+                batch = []
+                if len(pending) >= workers * 4:
+                    yield from finished(pending.popleft())
+        if batch:
+            pending.append(executor.submit(process_batch, batch, dp_one_line_date_format, file, options))
+        while pending:
+            yield from finished(pending.popleft())
+
+def iter_entries(stream, options=None):
+    #Parse a report from any text stream and yield each entry as a dict keyed by column header (see sheetHeaders).
+    #Values are typed: counts as int, rates as float, Start/End Time as datetime and the rest as text. Empty columns
+    #are left out, and a corrupt entry only has its Err marker under "S.No". Only entries are read, nothing is written.
+    options = options or clsOptions()
+    file = getattr(stream, "name", "stream")
+    dp_one_line_date_format, dateDetected, rawEntries = detect_date_format(stream)
+    numbered = ((rawEntry, curLine, curRow) for curRow, (rawEntry, curLine) in enumerate(rawEntries, 2))
+    if options.workers > 1:
+        results = parallel_rows(numbered, dp_one_line_date_format, file, options)
+    else:
+        results = (process_entry(rawEntry, curLine, curRow, dp_one_line_date_format, file, options) for rawEntry, curLine, curRow in numbered)
+    for style, row in results:
+        if not row:
+            continue
+        record = {}
+        for header, value in zip(sheetHeaders, row):
+            value = to_cell(value)
+            if value is not None:
+                record[header] = value
+        yield record
+
+def convert(stream, sink, options=None):
+    #Convert a report read from any text stream. sink is either an output path without an extension, which gets one
+    #file for each of options.formats, or a writer or list of writers with the same methods as those in OutputWriters.
+    #Returns the number of entries. Timings and counts for the report are left in metrics.
+    file = getattr(stream, "name", "stream")
+    if isinstance(sink, str):
+        return processData(stream, file, sink, options)
+    writers = list(sink) if isinstance(sink, (list, tuple)) else [sink]
+    return processData(stream, file, "", options, writers=writers)
+
+def input_files(options):
+    #Walk the input folder, leaving out the skip folders and everything in them. Yields (folder, file names).
+    for path, dirs, files in os.walk(options.inputPath):
+        if os.path.normpath(path) == os.path.normpath(options.inputPath):
+            dirs[:] = [folder for folder in dirs if folder not in skipFolders]
+        yield path, files
+
+def file_jobs(options, path, file, manifest=None, indexed=()):
+    #Sort one input file into the jobs to run and the ones to skip. An archive gives a job for each report in it.
+    #Returns (jobs as (inPath, member, file, outBase), summary lines for the ones skipped, whether it is an archive).
+    summary = []
+    jobList = []
+    inPath = os.path.join(path, file)
+    if is_archive(file):
+        #Each report in the archive is streamed straight from the archive and gets its own output.
+        try:
+            sources = [(member, os.path.basename(member), os.path.join(options.outputPath, member_output_base(file, member))) for member in archive_members(inPath)]
+        except Exception as err:
+            print(f'  Error reading archive {inPath}: {err}')
+            summary.append((inPath, f"Failed: {err}", 0, 0))
+            return jobList, summary, True
+        if not sources:
+            print(f"  No .csv reports found in {inPath}")
+    elif file.endswith(".csv"):
+        sources = [(None, file, os.path.join(options.outputPath, os.path.splitext(file)[0]))]
+    else:
+        return jobList, summary, False
+    for member, name, outBase in sources:
+        outPaths = [outBase + OutputWriters[outputFormat].extension for outputFormat in options.formats]
+        state = manifest.get(source_name(inPath, member)) if manifest else None
+        if options.buildIndex and source_name(inPath, member) not in indexed:
+            #Not in the attack index yet, so it is processed even if its outputs are up to date.
+            jobList.append((inPath, member, name, outBase))
+        elif is_unchanged(state, inPath, options.formats, outPaths):
+            print(f"  {source_name(inPath, member)} has not changed since it was last processed. Skipping")
+            summary.append((source_name(inPath, member), "Unchanged", 0, 0))
+        elif state or options.replaceExisting or not all(os.path.exists(outPath) for outPath in outPaths):
+            #Inputs in the manifest are picked up from their last checkpoint where possible.
+            jobList.append((inPath, member, name, outBase))
+        else:
+            print(f"  Output file: {', '.join(outPaths)} already exists. Skipping the processing of {source_name(inPath, member)}")
+            summary.append((source_name(inPath, member), "Skipped", 0, 0))
+    return jobList, summary, is_archive(file)
+
+def collect_jobs(options, manifest=None, indexed=()):
+    #Sort every report in the input folder into the jobs to run and the ones to skip.
+    #Returns (jobs as (inPath, member, file, outBase), summary lines for skipped inputs, whether archives were found).
+    summary = []
+    jobList = []
+    archiveFound = False
+    outBases = {}   #outBase -> source writing it, so two reports never write the same output
+    for path, files in input_files(options):
+        if len(files) == 0:
+            print("Please place DefenseProForensicReport.csv files in the ./input/ folder and rerun the script.")
+        for file in files:
+            fileJobs, skipped, isArchive = file_jobs(options, path, file, manifest, indexed)
+            for inPath, member, name, outBase in fileJobs:
+                other = outBases.setdefault(outBase, source_name(inPath, member))
+                if other != source_name(inPath, member):
+                    print(f"  {source_name(inPath, member)} would be written to the same output as {other}. Skipping")
+                    summary.append((source_name(inPath, member), f"Failed: same output as {other}", 0, 0))
                 else:
-                    print(f"  Output file: {output_path + outFile} already exists. Skipping the processing of {input_path + file}")    
+                    jobList.append((inPath, member, name, outBase))
+            summary += skipped
+            archiveFound = archiveFound or isArchive
+    return jobList, summary, archiveFound
+
+def run_batch(options):
+    #Process every report in options.inputPath (see clsBatchOptions) and print a summary. Returns the summary as
+    #a list of (input, status, entries parsed, elapsed seconds).
+    if not os.path.exists(options.inputPath):
+        print("input subfolder not found. It will be created for you.")
+        os.makedirs(options.inputPath)
+
+    if not os.path.exists(options.outputPath):
+        os.makedirs(options.outputPath)
+
+    #Collect the work first so skipped files show up in the summary too.
+    manifestPath = os.path.join(options.outputPath, manifestName) if options.incremental else None
+    manifest = clsManifest(manifestPath) if options.incremental else None
+    indexPath = os.path.join(options.outputPath, indexName) if options.buildIndex else None
+    indexed = indexed_sources(indexPath) if options.buildIndex else set()
+    jobList, summary, archiveFound = collect_jobs(options, manifest, indexed)
+    if manifest:
+        manifest.close()
+
+    #Archive members are processed in parallel by default when there is more than one CPU.
+    jobCount = options.jobs
+    if jobCount is None:
+        jobCount = (os.cpu_count() or 1) if archiveFound else jobs
+
+    if jobCount > 1 and len(jobList) > 1:
+        #Several files at once. Each file's output is printed as one block when it finishes so files don't interleave.
+        print(f"Processing {len(jobList)} files, {jobCount} at a time.")
+        import concurrent.futures
+        jobOptions = copy.copy(options)
+        jobOptions.interactive = False
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobCount, initializer=set_verbose, initargs=(verbose,)) as executor:
+            futures = {executor.submit(process_file, inPath, file, outBase, jobOptions, member, manifestPath, indexPath): source_name(inPath, member) for inPath, member, file, outBase in jobList}
+            for future in concurrent.futures.as_completed(futures):
+                status, entries, elapsed, log = future.result()
+                print(log, end='', flush=True)
+                summary.append((futures[future], status, entries, elapsed))
+    else:
+        for inPath, member, file, outBase in jobList:
+            status, entries, elapsed, log = process_file(inPath, file, outBase, options, member, manifestPath, indexPath)
+            #Empty when interactive, as the output was printed as it went.
+            print(log, end='', flush=True)
+            summary.append((source_name(inPath, member), status, entries, elapsed))
+
+    if summary:
+        print("\nSummary:")
+        for inPath, status, entries, elapsed in summary:
+            print(f"  {inPath}: {status}. {entries} entries in {elapsed:.2f} s")
+    return summary
+
+def warm_worker(verboseValue, formats):
+    #Initializer for the --watch pool. Everything a conversion imports is loaded once when the worker starts.
+    #Ctrl+C is left to the main process, which lets the reports being converted finish before stopping.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    set_verbose(verboseValue)
+    if "xlsx" in formats:
+        load_openpyxl()
+
+def watch_folder(options):
+    #Keep processing reports as they are dropped into options.inputPath, until stopped with Ctrl+C.
+    #The folder is polled every options.watchInterval seconds, which works the same on local disks and network shares.
+    #A report is queued once its size and modification time haven't changed for options.settleSeconds, so reports still
+    #being copied in are left alone. Queued reports go to a pool of worker processes that is started once, so each one
+    #only pays for its own conversion. A report that changes again after it was processed is queued again, and the
+    #manifest takes care of only parsing what is new.
+    import concurrent.futures
+    for folder in (options.inputPath, options.outputPath):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    manifestPath = os.path.join(options.outputPath, manifestName) if options.incremental else None
+    indexPath = os.path.join(options.outputPath, indexName) if options.buildIndex else None
+    jobCount = options.jobs or os.cpu_count() or 1
+    jobOptions = copy.copy(options)
+    jobOptions.interactive = False
+
+    seen = {}       #inPath -> (size, mtime, time either was last seen to change)
+    queued = {}     #inPath -> (size, mtime) when it was last queued
+    unfinished = collections.Counter() #inPath -> jobs queued or running for it
+    waiting = collections.deque()
+    running = {}    #future -> (source name, inPath)
+    summary = []
+    converted = 0
+    entries = 0
+    busy = 0.0      #Seconds with at least one report running, for the throughput
+
+    def print_status():
+        rate = entries / busy if busy else 0
+        print(f"  {datetime.now():%H:%M:%S} Queue: {len(waiting)} waiting, {len(running)} running. Done: {converted} reports, {entries} entries, {rate:.0f} entries/s", flush=True)
+
+    def start_pool():
+        #Start the workers now rather than when the first report arrives.
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobCount, initializer=warm_worker, initargs=(verbose, options.formats))
+        for future in [executor.submit(os.getpid) for _ in range(jobCount)]:
+            future.result()
+        return executor
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    #Stopping the service (SIGTERM) is handled the same as Ctrl+C.
+    signal.signal(signal.SIGTERM, stop)
+
+    def finish(future):
+        #Print a finished report's log and add it to the summary. Returns its entries and whether its worker died.
+        source, inPath = running.pop(future)
+        unfinished[inPath] -= 1
+        died = False
+        try:
+            status, count, elapsed, log = future.result()
+        except concurrent.futures.process.BrokenProcessPool as err:
+            #A worker died, e.g. killed for running out of memory. The report isn't retried until it changes.
+            status, count, elapsed, log = f"Failed: {err}", 0, 0, f"  Error processing {source}: {err}\n"
+            died = True
+        print(log, end='', flush=True)
+        summary.append((source, status, count, elapsed))
+        return count, died
+
+    print(f"Watching {options.inputPath} for reports with {jobCount} worker processes. Press Ctrl+C to stop.")
+    executor = start_pool()
+    broken = False
+    try:
+        nextStatus = time.perf_counter() + statusInterval
+        while True:
+            #Find the reports that have stopped changing.
+            now = time.perf_counter()
+            ready = []
+            present = set()
+            for path, files in input_files(options):
+                for file in files:
+                    if not (file.endswith(".csv") or is_archive(file)):
+                        continue
+                    inPath = os.path.join(path, file)
+                    try:
+                        stat = os.stat(inPath)
+                    except OSError:
+                        #Moved or deleted since the folder was listed.
+                        continue
+                    present.add(inPath)
+                    signature = (stat.st_size, stat.st_mtime)
+                    previous = seen.get(inPath)
+                    if previous is None or previous[:2] != signature:
+                        seen[inPath] = signature + (now,)
+                    elif now - previous[2] >= options.settleSeconds and queued.get(inPath) != signature and not unfinished[inPath]:
+                        ready.append((path, file, inPath, signature))
+            for inPath in list(seen):
+                if inPath not in present:
+                    del seen[inPath]
+                    queued.pop(inPath, None)
+
+            if ready:
+                manifest = clsManifest(manifestPath) if manifestPath else None
+                indexed = indexed_sources(indexPath) if indexPath else set()
+                for path, file, inPath, signature in ready:
+                    queued[inPath] = signature
+                    fileJobs, skipped, isArchive = file_jobs(options, path, file, manifest, indexed)
+                    waiting.extend(fileJobs)
+                    unfinished[inPath] += len(fileJobs)
+                    summary += skipped
+                if manifest:
+                    manifest.close()
+                if waiting:
+                    print_status()
+
+            #Reports wait here rather than in the pool's own queue, so the queue depth can be shown.
+            while waiting and len(running) < jobCount and not broken:
+                inPath, member, file, outBase = waiting.popleft()
+                future = executor.submit(process_file, inPath, file, outBase, jobOptions, member, manifestPath, indexPath)
+                running[future] = (source_name(inPath, member), inPath)
+
+            if running:
+                start = time.perf_counter()
+                finished, _ = concurrent.futures.wait(running, timeout=options.watchInterval, return_when=concurrent.futures.FIRST_COMPLETED)
+                busy += time.perf_counter() - start
+            else:
+                finished = ()
+                time.sleep(options.watchInterval)
+            for future in finished:
+                count, died = finish(future)
+                converted += 1
+                entries += count
+                broken = broken or died
+            if broken and not running:
+                #The other reports running in a broken pool fail too. Start a new one for the rest of the queue.
+                executor.shutdown(wait=False)
+                executor = start_pool()
+                broken = False
+            if finished or ((waiting or running) and time.perf_counter() >= nextStatus):
+                print_status()
+                nextStatus = time.perf_counter() + statusInterval
+    except KeyboardInterrupt:
+        print(f"\nStopping. {len(waiting)} waiting reports are left for the next run. Waiting for the {len(running)} running to finish.", flush=True)
+        for future in list(running):
+            finish(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if summary:
+        print("\nSummary:")
+        for inPath, status, count, elapsed in summary:
+            print(f"  {inPath}: {status}. {count} entries in {elapsed:.2f} s")
+    return summary
+
+def main(argv=None):
+    #Command line entry point. argv defaults to the script's own arguments.
+    #argparse is imported here so importing the script as a library doesn't pay for it.
+    import argparse
+    global verbose
+    parser = argparse.ArgumentParser(description="Convert DefensePro forensic reports with details to one line per entry.")
+    parser.add_argument("--input", default=input_path, help="Folder the reports are read from. Default: %(default)s")
+    parser.add_argument("--output", default=output_path, help="Folder the outputs, manifest and attack index are written to. Default: %(default)s")
+    parser.add_argument("--workers", type=int, default=workers, help="Number of processes used to parse entries. Default: %(default)s")
+    parser.add_argument("--jobs", type=int, default=None, help=f"Number of input files or archive members processed at the same time. Default: {jobs}, or one per CPU when archives are found")
+    parser.add_argument("--max-sample-values", type=int, default=maxSampleValues, help="Keep only the N most frequent values in each sample column, with their counts. 0 keeps them all. Default: %(default)s")
+    parser.add_argument("--no-incremental", action="store_true", help="Don't use the manifest. Every input without existing output is processed in full")
+    parser.add_argument("--verbose", action="store_true", help="Print a message for every corrupt entry instead of a count per Err code")
+    parser.add_argument("--no-progress", action="store_true", help="Don't show the progress line while a file is processed")
+    parser.add_argument("--metrics", choices=["json", "prom"], default=metricsFormat, help="Write timings and counts for each file to <output>.metrics.json, or <output>.prom for the Prometheus textfile collector")
+    parser.add_argument("--format", default=",".join(outputFormats), help=f"Comma separated list of output formats to write from one parse. Choose from {', '.join(OutputWriters)}. Default: %(default)s")
+    parser.add_argument("--xlsx-max-rows", type=int, default=xlsxMaxRows, help="Rows per xlsx sheet, header included. Larger reports carry on in another sheet or workbook. Default: %(default)s")
+    parser.add_argument("--xlsx-shard", choices=["sheet", "workbook"], default=xlsxShardMode, help="Where a full xlsx sheet carries on: another sheet in the workbook, or another workbook named <name>_part2.xlsx and so on. Default: %(default)s")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process reports as they are dropped into the input folder, with a pool of --jobs worker processes (default: one per CPU). Stop with Ctrl+C")
+    parser.add_argument("--watch-interval", type=float, default=watchInterval, help="Seconds between scans of the input folder with --watch. Default: %(default)s")
+    parser.add_argument("--settle", type=float, default=settleSeconds, help="Seconds a report's size must stay the same before --watch picks it up. Default: %(default)s")
+    parser.add_argument("--index", action="store_true", help=f"Add the entries of every report processed to the attack index, {indexName} in the output folder")
+    commands = parser.add_subparsers(dest="command", metavar="query", help="Search the attack index instead of processing reports. See query --help")
+    query = commands.add_parser("query", help="Search the attack index", description="Find entries in the attack index built with --index. All the filters given must match.")
+    query.add_argument("--ip", help="Source or destination IP, from the entry, its details or its samples")
+    query.add_argument("--source-ip", help="Source IP, from the entry, its details or its samples")
+    query.add_argument("--dest-ip", help="Destination IP, from the entry, its details or its samples")
+    query.add_argument("--attack-id", help="Attack ID")
+    query.add_argument("--radware-id", type=int, help="Radware ID")
+    query.add_argument("--policy", help="Policy Name")
+    query.add_argument("--from", dest="start", help="Entries active at or after this time. YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'")
+    query.add_argument("--to", dest="end", help="Entries active at or before this time. YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'")
+    query.add_argument("--report", help="Only reports whose path contains this text")
+    query.add_argument("--limit", type=int, default=100, help="Maximum number of entries returned. Default: %(default)s")
+    query.add_argument("--json", action="store_true", help="Print one JSON object per entry instead of a table")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        indexPath = os.path.join(args.output, indexName)
+        if not os.path.exists(indexPath):
+            print(f"{indexPath} not found. Process reports with --index to build it.")
+            exit()
+        startTime = time.perf_counter()
+        try:
+            results = query_index(indexPath, args.ip, args.source_ip, args.dest_ip, args.attack_id, args.radware_id, args.policy, args.start, args.end, args.report, args.limit)
+        except ValueError as err:
+            parser.error(str(err))
+        elapsed = time.perf_counter() - startTime
+        if args.json:
+            for result in results:
+                print(json.dumps(result))
+        else:
+            print_query_results(results)
+        print(f"{len(results)} entries found in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        exit()
+
+    formats = [outputFormat.strip().lower() for outputFormat in args.format.split(",") if outputFormat.strip()]
+    for outputFormat in formats:
+        if outputFormat not in OutputWriters:
+            parser.error(f"Unknown output format '{outputFormat}'. Choose from {', '.join(OutputWriters)}")
+    if not 2 <= args.xlsx_max_rows <= 1048576:
+        parser.error("--xlsx-max-rows must be between 2 and 1048576")
+    if "xlsx" in formats:
+        #Fail now rather than on every file.
+        try:
+            load_openpyxl()
+        except ImportError as err:
+            print(err)
+            exit()
+    verbose = verbose or args.verbose
+    options = clsBatchOptions(
+        inputPath=args.input,
+        outputPath=args.output,
+        jobs=args.jobs,
+        incremental=incremental and not args.no_incremental,
+        buildIndex=buildIndex or args.index,
+        formats=formats,
+        workers=args.workers,
+        sampleLimit=args.max_sample_values,
+        showProgress=showProgress and not args.no_progress,
+        metricsFormat=args.metrics,
+        xlsxMaxRows=args.xlsx_max_rows,
+        xlsxShardMode=args.xlsx_shard,
+        watchInterval=args.watch_interval,
+        settleSeconds=args.settle)
+    if args.watch:
+        watch_folder(options)
+    else:
+        run_batch(options)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+#Benchmark harness for DPForensicReportOneLine.py
+#Generates synthetic DefensePro forensic reports and times each stage of the conversion.
+#Results are written as JSON so runs from different versions of the script can be compared.
+#
+#Usage:
+#   python benchmark.py generate report.csv --entries 20000 --samples 12 --ipv6 0.3 --date-format dmy --corrupt 0.05
+#   python benchmark.py run --entries 20000 --output results.json
+#   python benchmark.py run --input .\input\report.csv --output results.json
+#   python benchmark.py startup --runs 10 --output startup.json
+#   python benchmark.py compare old.json new.json
+#   python benchmark.py check
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+try:
+    import resource
+except ImportError:
+    resource = None #Not available on Windows. Peak RSS is reported as null.
+
+#Synthetic report generator
+Headers = ["S.No","Start Time","End Time","Device IP Address","Threat Category","Attack Name","Policy Name","Action","Attack ID","Source IP Address","Source Port","Destination IP Address","Destination Port","Direction","Protocol","Radware ID","Duration","Total Packets","Total Packets Dropped","Packet Type","Total Mbits","Total Mbits Dropped","Max pps","Max bps","Max Attack Rate in Kb","Physical Port","Risk","VLAN Tag","Footprint"]
+Separator = "*" * 69 + ",,,,"
+AttackNames = ["SYN Flood", "UDP Flood", "DNS Flood", "HTTP Flood", "ICMP Flood", "TCP RST Flood"]
+#Corruptions the script reports, in the order of the Error handling section of the Readme.
+#Err5 is left out: the script only raises it for a Start or End Time it can't read, and that stops the whole file,
+#so a report with one couldn't be timed. A non-numeric S.No is skipped without an Err code.
+Corruptions = ["Err1", "Err2", "Err3", "Err4"]
+
+def random_ip(rng, ipv6):
+    if rng.random() < ipv6:
+        return "2001:db8::%x:%x" % (rng.randint(0, 65535), rng.randint(1, 65535))
+    return "10.%d.%d.%d" % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254))
+
+def random_time(rng, dateFormat, ambiguous=False):
+    day, month = rng.randint(1, 12 if ambiguous else 28), rng.randint(1, 12)
+    date = f"{day:02d}.{month:02d}.2024" if dateFormat == "dmy" else f"{month:02d}.{day:02d}.2024"
+    return f"{date} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+
+def generate_entry(rng, number, samples, ipv6, dateFormat, ambiguous=False):
+    #Lines of one well formed entry: header, data row, detail rows and an optional SAMPLE DETAILS section.
+    startTime = random_time(rng, dateFormat, ambiguous)
+    data = [str(number), startTime, startTime, "192.168.1.1", "DOSShield", rng.choice(AttackNames), "pol_%d" % rng.randint(1, 5), "Drop",
+            str(rng.randint(1, 99999)) + "-1402580209", "Multiple", "0", random_ip(rng, ipv6), str(rng.choice([80, 443])), "In", "TCP",
+            str(rng.randint(100, 400)), str(rng.randint(1, 999)), str(rng.randint(0, 10**6)), str(rng.randint(0, 10**6)), "Regular",
+            "%.2f" % rng.random(), "%.3f" % rng.random(), str(rng.randint(0, 999)), str(rng.randint(0, 99999)), "12.5", "T-1", "High", "N/A", ""]
+    lines = [",".join(Headers) + ",,,", ",".join(data) + ",,,"]
+    lines.append('Footprint,"[AND {OR {sport=1234}}]"')
+    lines.append("State,Ongoing")
+    sources = rng.randint(0, 3)
+    if sources:
+        lines.append("Source IP," + ",".join(random_ip(rng, ipv6) for _ in range(sources)))
+        lines.append("Source Port," + ",".join(str(rng.randint(1, 65535)) for _ in range(sources)))
+    lines.append("Destination IP," + random_ip(rng, ipv6))
+    lines.append("Destination Port,80")
+    sampleCount = rng.randint(0, samples * 2) if samples else 0
+    if sampleCount:
+        lines.append("SAMPLE DETAILS:,,,,")
+        lines.append("Source IP, Source Port, Destination IP, Destination Port, Physical Port, VLAN Tag, MPLS RD, Protocol")
+        for _ in range(sampleCount):
+            lines.append(",".join([random_ip(rng, ipv6), str(rng.randint(1, 65535)), random_ip(rng, ipv6), str(rng.choice([80, 443, 53])),
+                                   "T-1", str(rng.randint(0, 4)), "N/A", rng.choice(["TCP", "UDP"])]))
+    return lines
+
+def corrupt_entry(rng, lines, kind):
+    #Damage an entry the way the DefensePro sometimes does. See Error handling in the Readme.
+    if kind == "Err1":
+        return lines[:2] + lines #Multiple headers in same entry
+    if kind == "Err2":
+        return lines[1:] #Header line is missing
+    if kind == "Err3":
+        return [lines[1]] #<2 lines in entry
+    return [lines[0], ",".join(lines[1].split(",")[:5])] + lines[2:] #Err4: More headers than data
+
+def generate_report(path, entries=20000, samples=6, ipv6=0.3, dateFormat="dmy", corrupt=0.0, seed=1, ambiguous=False, append=False):
+    #Write a synthetic report and return how many entries of each corruption it holds.
+    #samples is the average number of SAMPLE DETAILS rows per entry, ipv6 the share of IPv6 addresses
+    #and corrupt the share of entries damaged, spread evenly over Err1 to Err4.
+    #With ambiguous every day is 12 or less, so the date format can't be told from the dates. With append the
+    #entries are added to the end of an existing report, as when a report grows.
+    rng = random.Random(seed)
+    injected = dict.fromkeys(Corruptions, 0)
+    with open(path, 'a' if append else 'w', newline='\n') as f:
+        for number in range(1, entries + 1):
+            lines = generate_entry(rng, number, samples, ipv6, dateFormat, ambiguous)
+            if rng.random() < corrupt:
+                kind = rng.choice(Corruptions)
+                injected[kind] += 1
+                lines = corrupt_entry(rng, lines, kind)
+            f.write("\n".join(lines))
+            f.write("\n" + Separator + "\n")
+    return injected
+
+#Stage harness
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class clsStageTimer:
+    #Times named stages over the same input and keeps the results for the report.
+    def __init__(self, entries, size):
+        self.entries = entries
+        self.size = size
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, entries=None):
+        entries = self.entries if entries is None else entries
+        rssBefore = peak_rss_mb()
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        rssAfter = peak_rss_mb()
+        self.stages[name] = {
+            "seconds": round(elapsed, 4),
+            "entries": entries,
+            "entries_per_sec": round(entries / elapsed, 1) if elapsed else None,
+            "mb_per_sec": round(self.size / (1024 * 1024) / elapsed, 2) if elapsed else None,
+            "peak_rss_mb": rssAfter,
+            "peak_rss_growth_mb": round(rssAfter - rssBefore, 1) if rssAfter is not None else None}
+        print(f"  {name}: {elapsed:.3f} s, {self.stages[name]['entries_per_sec']} entries/s", file=sys.stderr)
+
+def run_benchmark(inPath, workDir):
+    #Run the whole conversion once, then each stage on its own so they can be compared.
+    #Stages run in order on the results of the previous stage, which are kept in memory, so peak RSS is for the
+    #process so far. peak_rss_growth_mb is how much the peak rose during the stage.
+    import DPForensicReportOneLine as converter
+    size = os.path.getsize(inPath)
+    options = converter.clsOptions(interactive=False)
+    quiet = contextlib.redirect_stdout(io.StringIO()) #The script reports corrupt entries on stdout
+
+    #End to end. The script's own metrics give the time spent in each step of the pipeline.
+    start = time.perf_counter()
+    with quiet, open(inPath, 'r') as f:
+        entryCount = converter.processData(f, os.path.basename(inPath), os.path.join(workDir, "end_to_end"), options)
+    elapsed = time.perf_counter() - start
+    endToEnd = {
+        "seconds": round(elapsed, 4),
+        "entries": entryCount,
+        "entries_per_sec": round(entryCount / elapsed, 1),
+        "mb_per_sec": round(size / (1024 * 1024) / elapsed, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "steps": {stage: round(seconds, 4) for stage, seconds in converter.metrics.seconds.items()},
+        "counts": dict(converter.metrics.counts),
+        "errors": dict(converter.metrics.errors)}
+    print(f"  end_to_end: {elapsed:.3f} s, {endToEnd['entries_per_sec']} entries/s", file=sys.stderr)
+
+    timer = clsStageTimer(entryCount, size)
+    with timer.stage("split"), open(inPath, 'r') as f:
+        rawEntries = list(converter.iter_raw_entries(f))
+    with open(inPath, 'r') as f:
+        dateFormat, _, _ = converter.detect_date_format(f)
+
+    with timer.stage("parse"), quiet:
+        entries = [converter.clsEntry(rawEntry, line) for rawEntry, line in rawEntries if rawEntry]
+
+    aggregator = converter.get_sample_aggregator(0)
+    with timer.stage("sample_sort"):
+        for entry in entries:
+            if not entry.error:
+                aggregator.aggregate(entry.samples)
+
+    timestamps = converter.get_timestamp_converter(dateFormat)
+    with timer.stage("date_conversion"):
+        for entry in entries:
+            if entry.error:
+                continue
+            for column in converter.dateColumns:
+                value = entry.data[column]
+                try:
+                    if type(value) is tuple:
+                        for line in value:
+                            timestamps.convert(line)
+                    elif value:
+                        timestamps.convert(value)
+                except ValueError:
+                    pass
+    del entries
+
+    #Finished rows for the writer stages. Building them repeats the stages above, so it isn't timed.
+    with quiet:
+        rows = []
+        for curRow, (rawEntry, line) in enumerate(rawEntries, 2):
+            try:
+                rows.append(converter.process_entry(rawEntry, line, curRow, dateFormat, inPath, options))
+            except ValueError:
+                rows.append((None, []))
+    del rawEntries
+
+    writer = converter.clsXlsxWriter(converter.sheetHeaders, os.path.join(workDir, "stages.xlsx"))
+    with timer.stage("autofit"):
+        for style, row in rows:
+            writer.append(row, style)
+    del rows
+    with timer.stage("save"), quiet:
+        writer.close(interactive=False)
+
+    return {"end_to_end": endToEnd, "stages": timer.stages}
+
+ScriptPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DPForensicReportOneLine.py")
+
+def time_command(command, runs, cwd, before=None):
+    #Median and fastest wall time of a command over a number of runs. before is called ahead of each run.
+    times = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {"seconds": round(statistics.median(times), 4), "min_seconds": round(min(times), 4), "runs": runs}
+
+def run_startup_benchmark(workDir, runs=10, entries=10):
+    #Time how long the script takes to get going, which is most of the cost of converting small reports one at a time.
+    #python_only is the interpreter on its own, import is importing the script as a library, cli_csv and cli_xlsx
+    #convert a small report from the command line and convert_csv is a conversion through the library once imported.
+    inputPath = os.path.join(workDir, "input")
+    outputPath = os.path.join(workDir, "output")
+    os.makedirs(inputPath)
+    reportPath = os.path.join(inputPath, "report.csv")
+    generate_report(reportPath, entries)
+    scriptDir = os.path.dirname(ScriptPath)
+
+    def clean_output():
+        shutil.rmtree(outputPath, ignore_errors=True)
+
+    results = {"python_only": time_command([sys.executable, "-c", "pass"], runs, workDir)}
+    results["import"] = time_command([sys.executable, "-c", "import DPForensicReportOneLine"], runs, scriptDir)
+    check = subprocess.run([sys.executable, "-c", "import sys, DPForensicReportOneLine; print('openpyxl' in sys.modules)"], cwd=scriptDir, capture_output=True, text=True, check=True)
+    results["import"]["openpyxl_loaded"] = check.stdout.strip() == "True"
+    for outputFormat in ("csv", "xlsx"):
+        command = [sys.executable, ScriptPath, "--input", inputPath, "--output", outputPath, "--format", outputFormat, "--no-incremental", "--no-progress"]
+        results["cli_" + outputFormat] = time_command(command, runs, workDir, clean_output)
+
+    import DPForensicReportOneLine as converter
+    options = converter.clsOptions(formats=["csv"], interactive=False)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), open(reportPath, 'r') as f:
+            converter.convert(f, os.path.join(workDir, "convert"), options)
+        times.append(time.perf_counter() - start)
+    results["convert_csv"] = {"seconds": round(statistics.median(times), 4), "min_seconds": round(min(times), 4), "runs": runs}
+    for name, result in results.items():
+        print(f"  {name}: {result['seconds'] * 1000:.1f} ms", file=sys.stderr)
+    return {"startup": results}
+
+#Regression checks. Each one raises AssertionError with what went wrong, or the script's own error.
+def convert_report(converter, reportPath, outBase, **settings):
+    #Convert a report to csv and return the rows written.
+    options = converter.clsOptions(formats=["csv"], interactive=False, showProgress=False, **settings)
+    with contextlib.redirect_stdout(io.StringIO()), open(reportPath, 'r') as f:
+        converter.convert(f, outBase, options)
+    with open(outBase + ".csv", 'r', newline='') as f:
+        return f.read()
+
+def check_sample_cache(workDir):
+    #Sample columns must come out the same when the aggregator's caches fill up in the middle of an entry.
+    import DPForensicReportOneLine as converter
+    reportPath = os.path.join(workDir, "samples.csv")
+    generate_report(reportPath, entries=200, samples=40, corrupt=0)
+    expected = convert_report(converter, reportPath, os.path.join(workDir, "samples_full"))
+    cacheSize = converter.clsSampleAggregator.cacheSize
+    converter.clsSampleAggregator.cacheSize = 10
+    converter.sampleAggregators.clear()
+    try:
+        result = convert_report(converter, reportPath, os.path.join(workDir, "samples_small"))
+        result = convert_report(converter, reportPath, os.path.join(workDir, "samples_small")) #Again with full caches
+    finally:
+        converter.clsSampleAggregator.cacheSize = cacheSize
+        converter.sampleAggregators.clear()
+    assert result == expected, "output with a 10 value cache differs from the output with the default cache"
+
+def run_folder(converter, inputPath, outputPath, **settings):
+    options = converter.clsBatchOptions(inputPath=inputPath, outputPath=outputPath, interactive=False, showProgress=False, **settings)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return converter.run_batch(options)
+
+def check_xlsx_parts(workDir):
+    #Part workbooks are only removed when this output made them. <name>_part2.xlsx can be another report's output.
+    import DPForensicReportOneLine as converter
+    inputPath = os.path.join(workDir, "input")
+    outputPath = os.path.join(workDir, "output")
+    os.makedirs(inputPath)
+    reportPath = os.path.join(inputPath, "dp.csv")
+    generate_report(os.path.join(inputPath, "dp_part2.csv"), entries=5, corrupt=0)
+    generate_report(reportPath, entries=10, corrupt=0)
+    run_folder(converter, inputPath, outputPath, formats=["xlsx"], xlsxMaxRows=20)
+    generate_report(reportPath, entries=30, corrupt=0) #Grows past one sheet
+    run_folder(converter, inputPath, outputPath, formats=["xlsx"], xlsxMaxRows=20)
+    assert os.path.exists(os.path.join(outputPath, "dp_part2.xlsx")), "sheet mode removed the output of dp_part2.csv"
+
+    os.remove(os.path.join(inputPath, "dp_part2.csv"))
+    os.remove(os.path.join(outputPath, "dp_part2.xlsx"))
+    generate_report(reportPath, entries=50, corrupt=0, seed=2)
+    run_folder(converter, inputPath, outputPath, formats=["xlsx"], xlsxMaxRows=20, xlsxShardMode="workbook")
+    parts = [os.path.exists(os.path.join(outputPath, f"dp_part{number}.xlsx")) for number in (2, 3, 4)]
+    assert parts == [True, True, False], f"expected 3 workbooks for 50 entries, found parts {parts}"
+    generate_report(reportPath, entries=10, corrupt=0, seed=3) #Changed, so it starts over and needs one workbook
+    run_folder(converter, inputPath, outputPath, formats=["xlsx"], xlsxMaxRows=20, xlsxShardMode="workbook")
+    parts = [os.path.exists(os.path.join(outputPath, f"dp_part{number}.xlsx")) for number in (2, 3)]
+    assert parts == [False, False], f"part workbooks of the earlier run were left behind: {parts}"
+
+def check_date_format_resume(workDir):
+    #A report whose first entries all have ambiguous dates is continued with the month first fallback. Once new
+    #entries show the dates are day first, it has to start over rather than fail on every run after.
+    import DPForensicReportOneLine as converter
+    inputPath = os.path.join(workDir, "input")
+    outputPath = os.path.join(workDir, "output")
+    os.makedirs(inputPath)
+    reportPath = os.path.join(inputPath, "dmy.csv")
+    generate_report(reportPath, entries=20, dateFormat="dmy", ambiguous=True)
+    run_folder(converter, inputPath, outputPath, formats=["csv"])
+    generate_report(reportPath, entries=20, dateFormat="dmy", seed=2, append=True)
+    for _ in range(2):
+        summary = run_folder(converter, inputPath, outputPath, formats=["csv"])
+        assert summary[0][1] in ("OK", "Unchanged"), f"grown report failed: {summary[0][1]}"
+    expected = convert_report(converter, reportPath, os.path.join(workDir, "full"))
+    with open(os.path.join(outputPath, "dmy.csv"), 'r', newline='') as f:
+        assert f.read() == expected, "continued output differs from a full conversion"
+
+def check_late_date_format(workDir):
+    #A day first report whose first unambiguous date comes after dateLookahead entries. A file can be rewound, so it
+    #is scanned as far as it takes rather than guessed month first.
+    import DPForensicReportOneLine as converter
+    reportPath = os.path.join(workDir, "late.csv")
+    generate_report(reportPath, entries=converter.dateLookahead + 10, samples=0, dateFormat="dmy", ambiguous=True, corrupt=0)
+    generate_report(reportPath, entries=10, samples=0, dateFormat="dmy", seed=2, corrupt=0, append=True)
+    with open(reportPath, 'r') as f:
+        dateFormat, detected, _ = converter.detect_date_format(f)
+    assert detected and dateFormat == "%d.%m.%Y %H:%M:%S", f"detected {dateFormat}, found: {detected}"
+
+Checks = [check_sample_cache, check_xlsx_parts, check_date_format_resume, check_late_date_format]
+
+def run_checks(workDir):
+    #Run every regression check and return the number that failed.
+    failed = 0
+    for check in Checks:
+        checkDir = os.path.join(workDir, check.__name__)
+        os.makedirs(checkDir)
+        try:
+            check(checkDir)
+            print(f"  {check.__name__}: ok")
+        except Exception as err:
+            print(f"  {check.__name__}: FAILED. {type(err).__name__}: {err}")
+            failed += 1
+    return failed
+
+def compare_results(oldPath, newPath):
+    #Print the change in speed of each stage between two result files.
+    with open(oldPath) as f:
+        old = json.load(f)
+    with open(newPath) as f:
+        new = json.load(f)
+    #Stage results from run and startup results from startup can be compared the same way.
+    oldStages = dict(old.get("stages", {}), **old.get("startup", {}))
+    newStages = dict(new.get("stages", {}), **new.get("startup", {}))
+    if "end_to_end" in old and "end_to_end" in new:
+        oldStages["end_to_end"] = old["end_to_end"]
+        newStages["end_to_end"] = new["end_to_end"]
+    print(f"{'Stage':<18}{'Old s':>10}{'New s':>10}{'Speedup':>10}{'Old MB':>10}{'New MB':>10}")
+    for name, result in newStages.items():
+        if name not in oldStages:
+            continue
+        before = oldStages[name]
+        speedup = before["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        print(f"{name:<18}{before['seconds']:>10.3f}{result['seconds']:>10.3f}{speedup:>9.2f}x{str(before.get('peak_rss_mb')):>10}{str(result.get('peak_rss_mb')):>10}")
+
+def add_generator_arguments(parser):
+    parser.add_argument("--entries", type=int, default=20000, help="Number of entries. Default: %(default)s")
+    parser.add_argument("--samples", type=int, default=6, help="Average SAMPLE DETAILS rows per entry. Default: %(default)s")
+    parser.add_argument("--ipv6", type=float, default=0.3, help="Share of IP addresses that are IPv6, 0 to 1. Default: %(default)s")
+    parser.add_argument("--date-format", choices=["dmy", "mdy"], default="dmy", help="Layout of the dates, day.month.year or month.day.year. Default: %(default)s")
+    parser.add_argument("--corrupt", type=float, default=0.05, help="Share of entries damaged to trigger Err1 to Err4, 0 to 1. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed. The same settings and seed always give the same report. Default: %(default)s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DPForensicReportOneLine.py on synthetic forensic reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="Write a synthetic forensic report")
+    generate.add_argument("path", help="Report .csv to write")
+    add_generator_arguments(generate)
+    run = commands.add_parser("run", help="Time each stage and print the results as JSON")
+    run.add_argument("--input", help="Existing report to use instead of generating one")
+    run.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    add_generator_arguments(run)
+    startup = commands.add_parser("startup", help="Time starting the script on a small report and print the results as JSON")
+    startup.add_argument("--runs", type=int, default=10, help="Times each command is run. The median is reported. Default: %(default)s")
+    startup.add_argument("--entries", type=int, default=10, help="Entries in the small report converted. Default: %(default)s")
+    startup.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    commands.add_parser("check", help="Run the regression checks on small synthetic reports")
+    compare = commands.add_parser("compare", help="Compare two JSON result files")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        injected = generate_report(args.path, args.entries, args.samples, args.ipv6, args.date_format, args.corrupt, args.seed)
+        print(f"Wrote {args.entries} entries to {args.path}. Corrupt entries: {injected}")
+    elif args.command == "compare":
+        compare_results(args.old, args.new)
+    elif args.command == "check":
+        with tempfile.TemporaryDirectory() as workDir:
+            failed = run_checks(workDir)
+        sys.exit(1 if failed else 0)
+    elif args.command == "startup":
+        with tempfile.TemporaryDirectory() as workDir:
+            results = {"python": platform.python_version(), "platform": platform.platform()}
+            results.update(run_startup_benchmark(workDir, args.runs, args.entries))
+        text = json.dumps(results, indent=2)
+        print(text)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + "\n")
+    else:
+        with tempfile.TemporaryDirectory() as workDir:
+            generator = None
+            inPath = args.input
+            if inPath is None:
+                inPath = os.path.join(workDir, "report.csv")
+                injected = generate_report(inPath, args.entries, args.samples, args.ipv6, args.date_format, args.corrupt, args.seed)
+                generator = {"entries": args.entries, "samples": args.samples, "ipv6": args.ipv6, "date_format": args.date_format,
+                             "corrupt": args.corrupt, "seed": args.seed, "injected": injected}
+            print(f"Benchmarking {inPath} ({os.path.getsize(inPath) / (1024 * 1024):.1f} MB)", file=sys.stderr)
+            results = {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "input": {"path": args.input, "bytes": os.path.getsize(inPath), "generator": generator}}
+            results.update(run_benchmark(inPath, workDir))
+        text = json.dumps(results, indent=2)
+        print(text)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + "\n")